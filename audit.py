@@ -0,0 +1,128 @@
+import gc
+import os
+import sys
+import time
+import types
+import json
+import tracemalloc
+from collections import Counter, defaultdict
+
+# Opt-in entity lifecycle and memory auditing for long-running sessions. At each stage transition
+# the auditor runs a full garbage collection, counts live entities per class and per sprite group,
+# looks for entities that are still reachable after being killed, and diffs a tracemalloc snapshot
+# against the previous transition. Each transition is appended as one JSON line to a report file.
+# Auditing costs a full heap walk per transition and slows every allocation while tracemalloc is
+# tracing, so it is off unless asked for.
+
+GROWTH_TRANSITIONS = 4 # An entity or group count that rose at this many transitions in a row is flagged as growing
+TOP_GROWTH_LINES = 5
+REFERRERS_SHOWN = 3
+REFERRERS_SAMPLED = 10 # Survivors per class whose referrers are looked up
+
+class LifecycleAuditor:
+    def __init__(self, directory, entity_classes, group_classes, traceback_frames=1):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"audit-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.jsonl")
+        self.report = open(self.path, "w", encoding="utf-8")
+        self.entity_classes = {cls: cls.__name__ for cls in entity_classes}
+        self.group_classes = tuple(group_classes)
+        self.transitions = 0
+        self.history = defaultdict(list) # Metric name -> value at each transition
+        self.memory = [] # Traced bytes at each transition
+        self.survivor_total = 0
+        self.growing = set() # Every metric ever flagged as growing
+        tracemalloc.start(traceback_frames)
+        self.snapshot = self.take_snapshot()
+
+    def take_snapshot(self):
+        return tracemalloc.take_snapshot().filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),))
+
+    def stage_transition(self, label, stage, groups, persistent=()):
+        # groups maps a display name to each sprite group worth counting; persistent holds entities
+        # that legitimately outlive kill() (players waiting to respawn, the reused battleship)
+        started = time.perf_counter()
+        gc.collect()
+        group_names = {id(group): name for name, group in groups.items()}
+        persistent_ids = {id(entity) for entity in persistent}
+        live = Counter(); membership = defaultdict(Counter); survivors = Counter(); referrers = defaultdict(Counter)
+        group_objects = 0
+        objects = gc.get_objects()
+        for obj in objects:
+            class_name = self.entity_classes.get(type(obj))
+            if class_name is None:
+                if isinstance(obj, self.group_classes): group_objects += 1
+                continue
+            live[class_name] += 1
+            sprite_groups = obj.groups()
+            membership[class_name]["+".join(sorted(group_names.get(id(group), "unnamed") for group in sprite_groups)) or "none"] += 1
+            if not sprite_groups and id(obj) not in persistent_ids:
+                survivors[class_name] += 1
+                if survivors[class_name] <= REFERRERS_SAMPLED: # Each lookup walks the whole heap again
+                    for referrer in gc.get_referrers(obj):
+                        if referrer is not objects and not isinstance(referrer, types.FrameType):
+                            referrers[class_name][describe_referrer(referrer)] += 1
+        del objects
+
+        current_bytes, peak_bytes = tracemalloc.get_traced_memory()
+        snapshot = self.take_snapshot()
+        top_growth = [{"where": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}", "bytes": stat.size_diff, "count": stat.count_diff}
+                      for stat in snapshot.compare_to(self.snapshot, "lineno")[:TOP_GROWTH_LINES] if stat.size_diff > 0]
+        self.snapshot = snapshot
+
+        metrics = {f"live {name}": count for name, count in live.items()}
+        metrics.update({f"group {name}": len(group) for name, group in groups.items()})
+        metrics["sprite groups"] = group_objects # Traced memory is too noisy for this test; it is compared over whole runs instead
+        for name in set(self.history) | set(metrics):
+            self.history[name].append(metrics.get(name, 0))
+        growing = sorted(name for name, values in self.history.items() if is_growing(values))
+        self.growing.update(growing)
+        previous_bytes = self.memory[-1] if self.memory else current_bytes
+        self.memory.append(current_bytes)
+        self.survivor_total += sum(survivors.values())
+        self.transitions += 1
+
+        record = {
+            "transition": self.transitions, "label": label, "stage": stage, "traced_bytes": current_bytes, "peak_bytes": peak_bytes,
+            "live": dict(live), "groups": {name: len(group) for name, group in groups.items()}, "sprite_groups": group_objects,
+            "membership": {name: dict(combinations) for name, combinations in membership.items()},
+            "survived_kill": dict(survivors),
+            "survivor_referrers": {name: [f"{referrer} x{count}" for referrer, count in counts.most_common(REFERRERS_SHOWN)] for name, counts in referrers.items()},
+            "growing": growing, "top_growth": top_growth, "audit_ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+        self.report.write(json.dumps(record) + "\n"); self.report.flush()
+        print(f"Audit {label}: {current_bytes / 1024:.0f} KB traced ({(current_bytes - previous_bytes) / 1024:+.0f} KB), "
+              f"{sum(live.values())} live entities, {sum(survivors.values())} survived kill()")
+        for name, count in survivors.items():
+            print(f"  {count} {name} survived kill(), held by {', '.join(record['survivor_referrers'].get(name, ())) or 'nothing visible'}")
+        if growing: print(f"  Growing for {GROWTH_TRANSITIONS} transitions: {', '.join(growing)}")
+        return record
+
+    def close(self):
+        self.report.close()
+        tracemalloc.stop()
+
+def describe_referrer(referrer):
+    if isinstance(referrer, dict):
+        name = referrer.get("__name__")
+        return f"globals of {name}" if isinstance(name, str) else "dict"
+    return type(referrer).__name__
+
+def is_growing(values):
+    recent = values[-GROWTH_TRANSITIONS - 1:]
+    return len(recent) > GROWTH_TRANSITIONS and all(later > earlier for earlier, later in zip(recent, recent[1:]))
+
+# Reports
+def read_report(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def print_report(records):
+    print("transition  label                     traced KB  live  survived  growing")
+    for record in records:
+        print(f"{record['transition']:10d}  {record['label']:<24}  {record['traced_bytes'] / 1024:9.0f}  {sum(record['live'].values()):4d}"
+              f"  {sum(record['survived_kill'].values()):8d}  {', '.join(record['growing'])}")
+
+if __name__ == "__main__":
+    for path in sys.argv[1:]:
+        print(path)
+        print_report(read_report(path))
@@ -1,6 +1,39 @@
+import os
 import pygame
 import random
 import math # Needed for atan2 and vector math
+import struct # Binary game-state snapshots
+import zlib
+import time
+import itertools
+import argparse
+from collections import deque
+from netcode import (LoopbackNetwork, UdpTransport, diff_entities, apply_entity_delta, pack_snapshot, unpack_snapshot,
+                     PACKET_JOIN, PACKET_WELCOME, PACKET_INPUT, PACKET_SNAPSHOT, JOIN_PACKET, WELCOME_PACKET, INPUT_PACKET,
+                     SERVER_FULL)
+from telemetry import (TelemetryRecorder, EVENT_SHOT, EVENT_HIT, EVENT_KILL, EVENT_DAMAGE_TAKEN, EVENT_STAGE_START,
+                       EVENT_STAGE_CLEAR, EVENT_BATTLESHIP_SPAWN, EVENT_BATTLESHIP_KILL, EVENT_GAME_OVER, EVENT_REWIND, WEAPON_VULCAN,
+                       WEAPON_MISSILE, TARGET_WAREHOUSE, TARGET_AAGUN, TARGET_FIGHTER_JET, TARGET_BATTLESHIP, SOURCE_AAGUN,
+                       SOURCE_FIGHTER_JET, SOURCE_TURRET)
+from scores import ScoreStore
+from stages import load_stage_table, StageDataError
+from audit import LifecycleAuditor
+
+# Command Line
+COOP_PORT = 50007
+parser = argparse.ArgumentParser(description="Helicopter Game")
+parser.add_argument("--host", nargs="?", const=COOP_PORT, type=int, metavar="PORT", help="host a co-op game for up to 3 more players on the local network")
+parser.add_argument("--join", metavar="HOST[:PORT]", help="join a co-op game hosted with --host")
+parser.add_argument("--telemetry", nargs="?", const="telemetry", metavar="DIR", help="record gameplay events to DIR (summarize with telemetry.py)")
+parser.add_argument("--scores-db", default="highscores.db", metavar="PATH", help="high score and session history database")
+parser.add_argument("--stages", default="assets/stages", metavar="DIR", help="stage layout and difficulty files (reloaded when edited)")
+parser.add_argument("--audit", nargs="?", const="audit", metavar="DIR", help="audit entity lifecycles and memory at every stage transition, writing reports to DIR")
+parser.add_argument("--soak", type=float, metavar="SECONDS", help="play headless on autopilot for SECONDS of game time with --audit on, then exit non-zero if entities leaked or memory grew")
+parser.add_argument("--coop-bench", action="store_true", help="print co-op server tick time and bytes per tick as players are added, then exit")
+args = parser.parse_args(None if __name__ == "__main__" else []) # Imported (by the tests): defaults only
+if args.soak is not None:
+    args.audit = args.audit or "audit"
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy"); os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
 
 # Initialize Pygame
 pygame.init()
@@ -32,20 +65,24 @@ pygame.display.set_caption(SCREEN_TITLE)
 
 # Game clock
 clock = pygame.time.Clock()
-FPS = 60
-
-# Difficulty Scaling Parameters
-BASE_WAREHOUSE_HEALTH = 100
-WAREHOUSE_HEALTH_INCREASE_PER_STAGE = 20
-BASE_AAGUN_HEALTH = 50
-AAGUN_HEALTH_INCREASE_PER_STAGE = 10
-BASE_AAGUN_FIRE_RATE_MS = 2000
-AAGUN_FIRE_RATE_DECREASE_PER_STAGE = 100
-MIN_AAGUN_FIRE_RATE_MS = 800
-BASE_FIGHTER_HEALTH = 75
-FIGHTER_HEALTH_INCREASE_PER_STAGE = 15
-BASE_BATTLESHIP_HEALTH = 800
-BATTLESHIP_HEALTH_INCREASE_PER_STAGE = 100
+FPS = 60 # Simulation rate: the game logic always advances in steps of 1/FPS seconds
+RENDER_FPS_CAP = 144 # Rendering may run faster than the simulation and is interpolated
+FIXED_TIMESTEP_MS = 1000.0 / FPS
+MAX_CATCHUP_STEPS = 5 # Max simulation steps per rendered frame before dropping the backlog
+MAX_FRAME_TIME_MS = 250 # Clamp huge frame times (window drag, breakpoint) so we don't spiral
+
+# Simulation clock, advanced only by fixed update steps so game timers follow the simulation
+sim_time_ms = 0.0
+
+def get_game_ticks():
+    return int(sim_time_ms)
+
+# Stage Data: layouts, timed waves and difficulty curves, compiled per stage (file format in stages.py)
+STAGE_RELOAD_CHECK_MS = 1000 # How often the stage files are checked for edits
+try:
+    stage_table = load_stage_table(args.stages, (SCREEN_WIDTH, SCREEN_HEIGHT))
+except StageDataError as e:
+    raise SystemExit(f"Invalid stage data: {e}")
 
 # Sound Loading Helper
 def load_sound(name, default_volume=1.0):
@@ -82,17 +119,166 @@ sound_battleship_explosion = load_sound("battleship_explosion.wav.txt", 1.0)
 sound_stage_clear = load_sound("stage_clear.wav.txt", 0.8)
 sound_game_over = load_sound("game_over.wav.txt", 0.8)
 
+# Image Loading Helper
+loaded_images = {} # Each image file is read from disk once; sprites share the loaded Surface
+def load_image(name):
+    if name not in loaded_images:
+        try:
+            loaded_images[name] = pygame.image.load(f"assets/images/{name}").convert_alpha()
+        except (pygame.error, FileNotFoundError) as e:
+            loaded_images[name] = str(e)
+    image = loaded_images[name]
+    if isinstance(image, str): # Failed before; let the caller fall back without touching the disk again
+        raise pygame.error(image)
+    return image
+
 # Helper to play sounds safely
 def play_sound(sound_obj, loops=0): # Volume is now set at load time or per sound object
     if sound_obj and hasattr(sound_obj, 'play'):
         sound_obj.play(loops)
 
+# Telemetry Helper
+telemetry = None # TelemetryRecorder when enabled with --telemetry
+
+def record_event(kind, subject=0, value=0):
+    if telemetry is not None: telemetry.record(get_game_ticks(), kind, subject, current_stage, value)
+
+# Lifecycle Auditor Helper
+auditor = None # LifecycleAuditor when enabled with --audit
+pending_audit_label = None # Set by reset_stage; the audit runs at the start of the next step, once no locals hold old sprites
+
+def audit_stage_transition(label):
+    groups = {'all_sprites': all_sprites, 'warehouses': warehouses, 'aa_guns': aa_guns, 'fighter_jets': fighter_jets,
+              'enemy_bullets': enemy_bullets, 'battleship_group': battleship_group}
+    for slot, each_player in enumerate(players):
+        groups[f'player{slot}.vulcan_bullets'] = each_player.vulcan_bullets; groups[f'player{slot}.missiles'] = each_player.missiles
+    auditor.stage_transition(label, current_stage, groups, persistent=[*players, battleship]) # Both are reused across stages
+
+# Quality Governor
+class QualityGovernor:
+    # Optional work is shed one level at a time while frames run over budget, and restored
+    # in reverse order once there is headroom again.
+    LEVELS = [
+        {'name': "full", 'hud_refresh_frames': 1, 'rotation_step_deg': 0, 'health_bars': True},
+        {'name': "reduced HUD refresh", 'hud_refresh_frames': 10, 'rotation_step_deg': 0, 'health_bars': True},
+        {'name': "coarse rotation", 'hud_refresh_frames': 10, 'rotation_step_deg': 15, 'health_bars': True},
+        {'name': "no health bars", 'hud_refresh_frames': 10, 'rotation_step_deg': 15, 'health_bars': False},
+    ]
+
+    def __init__(self, budget_ms=FIXED_TIMESTEP_MS):
+        self.budget_ms = budget_ms
+        self.shed_threshold_ms = budget_ms * 0.9 # Shed when the average frame uses 90% of the budget
+        self.restore_threshold_ms = budget_ms * 0.6 # Restore when at least 40% headroom is back
+        self.adjust_cooldown_frames = 60 # Let the average settle before adjusting again
+        self.smoothing = 0.1
+        self.avg_frame_ms = 0.0
+        self.frames_since_adjust = 0
+        self.level = 0
+
+    @property
+    def settings(self): return self.LEVELS[self.level]
+    @property
+    def hud_refresh_frames(self): return self.settings['hud_refresh_frames']
+    @property
+    def rotation_step_deg(self): return self.settings['rotation_step_deg']
+    @property
+    def health_bars(self): return self.settings['health_bars']
+
+    def record_frame(self, frame_work_ms):
+        self.avg_frame_ms += (frame_work_ms - self.avg_frame_ms) * self.smoothing
+        self.frames_since_adjust += 1
+        if self.frames_since_adjust < self.adjust_cooldown_frames:
+            return
+        if self.avg_frame_ms > self.shed_threshold_ms and self.level < len(self.LEVELS) - 1:
+            self.set_level(self.level + 1)
+        elif self.avg_frame_ms < self.restore_threshold_ms and self.level > 0:
+            self.set_level(self.level - 1)
+
+    def set_level(self, level):
+        previous = self.settings['name']
+        self.level = level
+        self.frames_since_adjust = 0
+        print(f"Quality: {previous} -> {self.settings['name']} (avg frame {self.avg_frame_ms:.1f}ms, budget {self.budget_ms:.1f}ms)")
+
+quality = QualityGovernor()
+
+# Render Interpolation Helpers
+def remember_position(sprite):
+    sprite.prev_center = sprite.rect.center
+
+def interpolated_topleft(sprite, alpha):
+    # Blend between the positions before and after the last simulation step
+    prev_center = getattr(sprite, 'prev_center', None)
+    if prev_center is None:
+        return sprite.rect.topleft
+    center_x = prev_center[0] + (sprite.rect.centerx - prev_center[0]) * alpha
+    center_y = prev_center[1] + (sprite.rect.centery - prev_center[1]) * alpha
+    return (round(center_x - sprite.rect.width / 2), round(center_y - sprite.rect.height / 2))
+
+# Render Queue
+# Draw order, back to front. Within a layer the order is unspecified.
+(LAYER_STRUCTURES, LAYER_BATTLESHIP, LAYER_AIRCRAFT, LAYER_PROJECTILES, LAYER_PLAYER,
+ LAYER_HEALTH_BARS, LAYER_HUD) = range(7)
+LAYER_COUNT = 7
+
+def texture_key(command):
+    return id(command[0])
+
+class RenderQueue:
+    # Entities submit (image, position) commands into per-layer buckets during the frame; flush()
+    # sorts each layer by image so identical textures are drawn back to back and hands the whole
+    # layer to a single Surface.blits call instead of one Python-level blit per sprite.
+    def __init__(self):
+        self.layers = [[] for _ in range(LAYER_COUNT)]
+        self.draw_calls = 0 # Per flushed frame
+        self.blit_count = 0
+        self.flush_ms = 0.0
+
+    def submit(self, layer, image, position):
+        self.layers[layer].append((image, position))
+
+    def flush(self, target):
+        started = time.perf_counter()
+        draw_calls = blit_count = 0
+        for commands in self.layers:
+            if not commands: continue
+            commands.sort(key=texture_key)
+            target.blits(commands, doreturn=False)
+            draw_calls += 1; blit_count += len(commands)
+            commands.clear()
+        self.draw_calls = draw_calls; self.blit_count = blit_count
+        self.flush_ms = (time.perf_counter() - started) * 1000
+
+render_queue = RenderQueue()
+
+# Health Bar Helper
+health_bar_surfaces = {} # Pre-rendered bars keyed by size, fill step and colour, so a bar costs one blit
+HEALTH_BAR_STEPS = 40 # Fill is quantized so the cache stays small however max health scales with the stage
+
+def health_bar_surface(width, height, health_ratio, fill_color, background_color=None):
+    # An outlined bar, or with background_color a solid bar without outline (the player's HUD bar)
+    width = int(width)
+    fill_step = math.ceil(health_ratio * HEALTH_BAR_STEPS) # Any health left shows at least one step
+    key = (width, height, fill_step, fill_color, background_color)
+    bar = health_bar_surfaces.get(key)
+    if bar is None:
+        bar = pygame.Surface((width, height), pygame.SRCALPHA)
+        fill_width = (width if background_color else width - 2) * fill_step // HEALTH_BAR_STEPS
+        if background_color:
+            bar.fill(background_color)
+            bar.fill(fill_color, (0, 0, fill_width, height))
+        else:
+            pygame.draw.rect(bar, BLACK, (0, 0, width, height), 1)
+            bar.fill(fill_color, (1, 1, fill_width, height - 2))
+        health_bar_surfaces[key] = bar
+    return bar
+
 # Bullet Class
 class Bullet(pygame.sprite.Sprite):
     def __init__(self, x, y, direction_x, direction_y):
         super().__init__()
         try:
-            self.image = pygame.image.load("assets/images/vulcan_bullet.png").convert_alpha()
+            self.image = load_image("vulcan_bullet.png")
         except pygame.error as e:
             print(f"Error loading vulcan_bullet.png: {e}")
             self.image = pygame.Surface([10, 4]) # Fallback
@@ -112,15 +298,15 @@ class Bullet(pygame.sprite.Sprite):
            self.rect.right < 0 or self.rect.left > SCREEN_WIDTH:
             self.kill()
 
-    def draw(self, surface):
-        surface.blit(self.image, self.rect)
+    def draw(self, render_queue, alpha=1.0):
+        render_queue.submit(LAYER_PROJECTILES, self.image, interpolated_topleft(self, alpha))
 
 # Missile Class
 class Missile(pygame.sprite.Sprite):
     def __init__(self, x, y, direction_x, direction_y):
         super().__init__()
         try:
-            self.image = pygame.image.load("assets/images/missile.png").convert_alpha()
+            self.image = load_image("missile.png")
         except pygame.error as e:
             print(f"Error loading missile.png: {e}")
             self.image = pygame.Surface([20, 8]) # Fallback
@@ -140,15 +326,15 @@ class Missile(pygame.sprite.Sprite):
            self.rect.right < 0 or self.rect.left > SCREEN_WIDTH:
             self.kill()
 
-    def draw(self, surface):
-        surface.blit(self.image, self.rect)
+    def draw(self, render_queue, alpha=1.0):
+        render_queue.submit(LAYER_PROJECTILES, self.image, interpolated_topleft(self, alpha))
 
 # Enemy Bullet Class
 class EnemyBullet(pygame.sprite.Sprite):
-    def __init__(self, x, y, target_x=None, target_y=None, fixed_direction_y=-1):
+    def __init__(self, x, y, target_x=None, target_y=None, fixed_direction_y=-1, source=0):
         super().__init__()
         try:
-            self.image = pygame.image.load("assets/images/enemy_bullet.png").convert_alpha()
+            self.image = load_image("enemy_bullet.png")
         except pygame.error as e:
             print(f"Error loading enemy_bullet.png: {e}")
             self.image = pygame.Surface([8, 8]) # Fallback
@@ -158,6 +344,7 @@ class EnemyBullet(pygame.sprite.Sprite):
         self.rect.centery = y
         self.speed = 7
         self.damage = 10
+        self.source = source # Telemetry damage source (SOURCE_*)
 
         if target_x is not None and target_y is not None:
             direction_x = target_x - x
@@ -180,15 +367,15 @@ class EnemyBullet(pygame.sprite.Sprite):
            self.rect.right < 0 or self.rect.left > SCREEN_WIDTH:
             self.kill()
 
-    def draw(self, surface):
-        surface.blit(self.image, self.rect)
+    def draw(self, render_queue, alpha=1.0):
+        render_queue.submit(LAYER_PROJECTILES, self.image, interpolated_topleft(self, alpha))
 
 # Warehouse Class
 class Warehouse(pygame.sprite.Sprite):
     def __init__(self, x, y, width=100, height=60, initial_health=100):
         super().__init__()
         try:
-            self.image_orig = pygame.image.load("assets/images/warehouse.png").convert_alpha()
+            self.image_orig = load_image("warehouse.png")
         except pygame.error as e:
             print(f"Error loading warehouse.png: {e}")
             self.image_orig = pygame.Surface([width, height])
@@ -209,27 +396,22 @@ class Warehouse(pygame.sprite.Sprite):
         self.health -= amount
         if self.health < 0:
             self.health = 0
-        self.update_health_bar()
 
     def is_destroyed(self):
         return self.health <= 0
 
-    def update_health_bar(self):
-        self.image = self.image_orig.copy()
-        if self.health > 0:
-            health_ratio = self.health / self.max_health
-            pygame.draw.rect(self.image, BLACK, (0, -self.health_bar_y_offset, self.rect.width, self.health_bar_height), 1)
-            pygame.draw.rect(self.image, GREEN, (1, -self.health_bar_y_offset + 1, (self.rect.width - 2) * health_ratio, self.health_bar_height - 2))
-
-    def draw(self, surface):
-        surface.blit(self.image, (self.rect.x, self.rect.y - self.health_bar_y_offset if self.health > 0 else self.rect.y))
+    def draw(self, render_queue, alpha=1.0):
+        render_queue.submit(LAYER_STRUCTURES, self.image, self.rect.topleft)
+        if quality.health_bars and self.health > 0:
+            render_queue.submit(LAYER_HEALTH_BARS, health_bar_surface(self.rect.width, self.health_bar_height, self.health / self.max_health, GREEN),
+                                (self.rect.x, self.rect.y - self.health_bar_y_offset))
 
 # Anti-Aircraft Gun (AAGun) Class
 class AAGun(pygame.sprite.Sprite):
-    def __init__(self, x, y, fire_rate_ms=BASE_AAGUN_FIRE_RATE_MS, initial_health=BASE_AAGUN_HEALTH):
+    def __init__(self, x, y, fire_rate_ms=2000, initial_health=50):
         super().__init__()
         try:
-            self.image_orig = pygame.image.load("assets/images/aagun.png").convert_alpha()
+            self.image_orig = load_image("aagun.png")
         except pygame.error as e:
             print(f"Error loading aagun.png: {e}")
             self.image_orig = pygame.Surface([30, 30])
@@ -238,7 +420,7 @@ class AAGun(pygame.sprite.Sprite):
         self.rect = self.image.get_rect()
         self.rect.center = (x, y)
         self.fire_rate = fire_rate_ms
-        self.last_shot_time = pygame.time.get_ticks() + random.randint(0, int(fire_rate_ms))
+        self.last_shot_time = get_game_ticks() + random.randint(0, int(fire_rate_ms))
         self.max_health = initial_health
         self.health = self.max_health
         self.health_bar_height = 5
@@ -249,14 +431,13 @@ class AAGun(pygame.sprite.Sprite):
         self.enemy_bullets_group = group
 
     def update(self, player_pos):
-        current_time = pygame.time.get_ticks()
+        current_time = get_game_ticks()
         if current_time - self.last_shot_time > self.fire_rate:
             self.last_shot_time = current_time
             if self.enemy_bullets_group is not None:
                 play_sound(sound_enemy_fire)
-                bullet = EnemyBullet(self.rect.centerx, self.rect.top, fixed_direction_y=-1)
+                bullet = EnemyBullet(self.rect.centerx, self.rect.top, fixed_direction_y=-1, source=SOURCE_AAGUN)
                 self.enemy_bullets_group.add(bullet)
-        self.update_health_bar()
 
     def take_damage(self, amount):
         self.health -= amount
@@ -266,28 +447,25 @@ class AAGun(pygame.sprite.Sprite):
     def is_destroyed(self):
         return self.health <= 0
 
-    def update_health_bar(self):
-        self.image = self.image_orig.copy()
-        if self.health > 0 and self.health < self.max_health:
-            health_ratio = self.health / self.max_health
-            pygame.draw.rect(self.image, BLACK, (0, -self.health_bar_y_offset, self.rect.width, self.health_bar_height), 1)
-            pygame.draw.rect(self.image, RED, (1, -self.health_bar_y_offset + 1, (self.rect.width - 2) * health_ratio, self.health_bar_height - 2))
-
-    def draw(self, surface):
-        surface.blit(self.image, (self.rect.x, self.rect.y - self.health_bar_y_offset if self.health > 0 and self.health < self.max_health else self.rect.y))
+    def draw(self, render_queue, alpha=1.0):
+        render_queue.submit(LAYER_STRUCTURES, self.image, self.rect.topleft)
+        if quality.health_bars and self.health > 0 and self.health < self.max_health:
+            render_queue.submit(LAYER_HEALTH_BARS, health_bar_surface(self.rect.width, self.health_bar_height, self.health / self.max_health, RED),
+                                (self.rect.x, self.rect.y - self.health_bar_y_offset))
 
 # Fighter Jet Class
 class FighterJet(pygame.sprite.Sprite):
-    def __init__(self, x, y, player_ref_for_speed, enemy_bullets_group_ref, initial_health=BASE_FIGHTER_HEALTH):
+    def __init__(self, x, y, player_ref_for_speed, enemy_bullets_group_ref, initial_health=75):
         super().__init__()
         self.size = 30
         try:
-            self.original_image = pygame.image.load("assets/images/fighter_jet.png").convert_alpha()
+            self.original_image = load_image("fighter_jet.png")
         except pygame.error as e:
             print(f"Error loading fighter_jet.png: {e}")
             self.original_image = pygame.Surface((self.size, self.size), pygame.SRCALPHA)
             pygame.draw.polygon(self.original_image, BLUE, [(self.size, self.size // 2), (0, 0), (0, self.size -1)])
         self.image = self.original_image.copy()
+        self.image_angle_deg = 0
         self.rect = self.image.get_rect(center=(x,y))
         self.max_health = initial_health
         self.health = self.max_health
@@ -297,7 +475,7 @@ class FighterJet(pygame.sprite.Sprite):
         self.velocity_x = math.cos(self.current_angle_rad) * self.speed
         self.velocity_y = math.sin(self.current_angle_rad) * self.speed
         self.fire_rate = 2500
-        self.last_shot_time = pygame.time.get_ticks() + random.randint(0, self.fire_rate)
+        self.last_shot_time = get_game_ticks() + random.randint(0, self.fire_rate)
         self.enemy_bullets_group = enemy_bullets_group_ref
         self.health_bar_height = 5
         self.health_bar_y_offset = 10
@@ -318,9 +496,14 @@ class FighterJet(pygame.sprite.Sprite):
         self.velocity_y = math.sin(self.current_angle_rad) * self.speed
         self.rect.x += self.velocity_x
         self.rect.y += self.velocity_y
-        self.image = pygame.transform.rotate(self.original_image, -math.degrees(self.current_angle_rad))
-        self.rect = self.image.get_rect(center=self.rect.center)
-        current_time = pygame.time.get_ticks()
+        image_angle_deg = -math.degrees(self.current_angle_rad)
+        if quality.rotation_step_deg: # Coarse rotation: snap to steps so the rotated image is reused
+            image_angle_deg = round(image_angle_deg / quality.rotation_step_deg) * quality.rotation_step_deg
+        if image_angle_deg != self.image_angle_deg:
+            self.image_angle_deg = image_angle_deg
+            self.image = pygame.transform.rotate(self.original_image, image_angle_deg)
+            self.rect = self.image.get_rect(center=self.rect.center)
+        current_time = get_game_ticks()
         if current_time - self.last_shot_time > self.fire_rate:
             self.last_shot_time = current_time
             if self.enemy_bullets_group is not None:
@@ -329,7 +512,7 @@ class FighterJet(pygame.sprite.Sprite):
                 bullet_dy = math.sin(self.current_angle_rad)
                 spawn_x = self.rect.centerx + bullet_dx * (self.size / 2)
                 spawn_y = self.rect.centery + bullet_dy * (self.size / 2)
-                bullet = EnemyBullet(spawn_x, spawn_y, target_x=spawn_x + bullet_dx, target_y=spawn_y + bullet_dy)
+                bullet = EnemyBullet(spawn_x, spawn_y, target_x=spawn_x + bullet_dx, target_y=spawn_y + bullet_dy, source=SOURCE_FIGHTER_JET)
                 self.enemy_bullets_group.add(bullet)
         if self.rect.left < 0 or self.rect.right > SCREEN_WIDTH:
             self.velocity_x *= -1
@@ -354,16 +537,15 @@ class FighterJet(pygame.sprite.Sprite):
     def update_health_bar(self):
         pass
 
-    def draw(self, surface):
-        surface.blit(self.image, self.rect)
-        if self.health > 0 and self.health < self.max_health:
+    def draw(self, render_queue, alpha=1.0):
+        draw_x, draw_y = interpolated_topleft(self, alpha)
+        render_queue.submit(LAYER_AIRCRAFT, self.image, (draw_x, draw_y))
+        if quality.health_bars and self.health > 0 and self.health < self.max_health:
             bar_width = self.rect.width * 0.8
             bar_height = self.health_bar_height
-            bar_pos_x = self.rect.centerx - bar_width / 2
-            bar_pos_y = self.rect.top - self.health_bar_y_offset - bar_height
-            health_ratio = self.health / self.max_health
-            pygame.draw.rect(surface, BLACK, (bar_pos_x, bar_pos_y, bar_width, bar_height), 1)
-            pygame.draw.rect(surface, RED, (bar_pos_x + 1, bar_pos_y + 1, (bar_width - 2) * health_ratio, bar_height - 2))
+            bar_pos_x = draw_x + self.rect.width / 2 - bar_width / 2
+            bar_pos_y = draw_y - self.health_bar_y_offset - bar_height
+            render_queue.submit(LAYER_HEALTH_BARS, health_bar_surface(bar_width, bar_height, self.health / self.max_health, RED), (bar_pos_x, bar_pos_y))
 
 # Battleship Class
 class Battleship(pygame.sprite.Sprite):
@@ -372,7 +554,7 @@ class Battleship(pygame.sprite.Sprite):
         self.expected_width = SCREEN_WIDTH * 0.8
         self.expected_height = 100
         try:
-            self.original_image = pygame.image.load("assets/images/battleship.png").convert_alpha()
+            self.original_image = load_image("battleship.png").copy() # Turrets are drawn onto it
         except pygame.error as e:
             print(f"Error loading battleship.png: {e}")
             self.original_image = pygame.Surface((self.expected_width, self.expected_height))
@@ -381,12 +563,14 @@ class Battleship(pygame.sprite.Sprite):
         self.height = self.original_image.get_height()
         self.image = self.original_image.copy()
         self.rect = self.image.get_rect(center=(-self.width // 2, SCREEN_HEIGHT // 3))
-        self.max_health = BASE_BATTLESHIP_HEALTH
+        self.max_health = 800 # Set per stage by reset_stage
         self.health = self.max_health
         self.speed = 0.5
         self.direction = 1
         self.enemy_bullets_group = enemy_bullets_group_ref
         self.is_active = False
+        self.pause_duration = 5000
+        self.turn_time = None # Simulation time at which the paused ship applies its turn
         self.turret_positions_relative = [
             (self.width * 0.2, self.height * 0.3), (self.width * 0.5, self.height * 0.3),
             (self.width * 0.8, self.height * 0.3), (self.width * 0.35, self.height * 0.7),
@@ -397,7 +581,7 @@ class Battleship(pygame.sprite.Sprite):
             pygame.draw.rect(self.original_image, GRAY, (pos[0] - turret_size//2, pos[1] - turret_size//2, turret_size, turret_size))
             self.turrets.append({
                 'rel_pos': pos,
-                'last_shot': pygame.time.get_ticks() + random.randint(0, 3000) + (i * 500),
+                'last_shot': get_game_ticks() + random.randint(0, 3000) + (i * 500),
                 'fire_rate': random.randint(2800, 3500) })
         self.image = self.original_image.copy()
         self.health_bar_height = 15
@@ -408,19 +592,23 @@ class Battleship(pygame.sprite.Sprite):
         self.health = self.max_health
         self.is_active = True
         self.direction = 1
+        self.turn_time = None
 
     def update(self, player_pos):
         if not self.is_active: return
+        current_time = get_game_ticks()
+        if self.turn_time is not None and current_time >= self.turn_time:
+            self.turn_time = None
+            self.direction *= -1
         self.rect.x += self.speed * self.direction
         if self.direction == 1 and self.rect.left >= SCREEN_WIDTH * 0.1:
             self.direction = 0
-            pygame.time.set_timer(pygame.USEREVENT + 1, 5000, True)
+            self.turn_time = current_time + self.pause_duration
         elif self.direction == -1 and self.rect.right <= SCREEN_WIDTH * 0.9:
             self.direction = 0
-            pygame.time.set_timer(pygame.USEREVENT + 1, 5000, True)
+            self.turn_time = current_time + self.pause_duration
         if self.rect.right > SCREEN_WIDTH + self.width /2 : self.is_active = False
         elif self.rect.left < -self.width * 1.5 : self.is_active = False
-        current_time = pygame.time.get_ticks()
         for turret in self.turrets:
             if current_time - turret['last_shot'] > turret['fire_rate']:
                 turret['last_shot'] = current_time
@@ -429,7 +617,7 @@ class Battleship(pygame.sprite.Sprite):
                 target_x = player_pos[0] + random.randint(-50, 50)
                 target_y = player_pos[1] + random.randint(-20, 20)
                 play_sound(sound_enemy_fire)
-                bullet = EnemyBullet(turret_abs_x, turret_abs_y, target_x=target_x, target_y=target_y)
+                bullet = EnemyBullet(turret_abs_x, turret_abs_y, target_x=target_x, target_y=target_y, source=SOURCE_TURRET)
                 self.enemy_bullets_group.add(bullet)
                 all_sprites.add(bullet)
 
@@ -440,32 +628,66 @@ class Battleship(pygame.sprite.Sprite):
 
     def is_destroyed(self): return self.health <= 0
 
-    def draw(self, surface):
+    def draw(self, render_queue, alpha=1.0):
         if not self.is_active: return
-        surface.blit(self.image, self.rect)
-        if self.health > 0:
+        draw_x, draw_y = interpolated_topleft(self, alpha)
+        render_queue.submit(LAYER_BATTLESHIP, self.image, (draw_x, draw_y))
+        if quality.health_bars and self.health > 0:
             bar_width = self.width * 0.9
             bar_height = self.health_bar_height
-            bar_pos_x = self.rect.centerx - bar_width / 2
-            bar_pos_y = self.rect.top - self.health_bar_y_offset - bar_height
-            health_ratio = self.health / self.max_health
-            pygame.draw.rect(surface, BLACK, (bar_pos_x, bar_pos_y, bar_width, bar_height), 1)
-            pygame.draw.rect(surface, GREEN, (bar_pos_x + 1, bar_pos_y + 1, (bar_width - 2) * health_ratio, bar_height - 2))
+            bar_pos_x = draw_x + self.rect.width / 2 - bar_width / 2
+            bar_pos_y = draw_y - self.health_bar_y_offset - bar_height
+            render_queue.submit(LAYER_HEALTH_BARS, health_bar_surface(bar_width, bar_height, self.health / self.max_health, GREEN), (bar_pos_x, bar_pos_y))
+
+# Player Input Bitmask (also what co-op clients send to the server each tick)
+INPUT_LEFT = 1
+INPUT_RIGHT = 2
+INPUT_UP = 4
+INPUT_DOWN = 8
+INPUT_VULCAN = 16
+INPUT_MISSILE = 32
+
+def input_bits_from_keys(keys):
+    bits = 0
+    if keys[pygame.K_LEFT] or keys[pygame.K_a]: bits |= INPUT_LEFT
+    if keys[pygame.K_RIGHT] or keys[pygame.K_d]: bits |= INPUT_RIGHT
+    if keys[pygame.K_UP] or keys[pygame.K_w]: bits |= INPUT_UP
+    if keys[pygame.K_DOWN] or keys[pygame.K_s]: bits |= INPUT_DOWN
+    if keys[pygame.K_SPACE]: bits |= INPUT_VULCAN
+    if keys[pygame.K_m]: bits |= INPUT_MISSILE
+    return bits
+
+def movement_velocity(bits, speed):
+    velocity_x = 0; velocity_y = 0
+    if bits & INPUT_LEFT: velocity_x = -speed
+    if bits & INPUT_RIGHT: velocity_x = speed
+    if bits & INPUT_UP: velocity_y = -speed
+    if bits & INPUT_DOWN: velocity_y = speed
+    if velocity_x != 0 and velocity_y != 0:
+        velocity_x /= 1.414; velocity_y /= 1.414
+    return velocity_x, velocity_y
+
+def clamp_to_screen(rect):
+    if rect.left < 0: rect.left = 0
+    if rect.right > SCREEN_WIDTH: rect.right = SCREEN_WIDTH
+    if rect.top < 0: rect.top = 0
+    if rect.bottom > SCREEN_HEIGHT: rect.bottom = SCREEN_HEIGHT
 
 # Player Helicopter Class
 class Player(pygame.sprite.Sprite):
-    def __init__(self):
+    def __init__(self, spawn_x=SCREEN_WIDTH // 2, spawn_y=SCREEN_HEIGHT // 2):
         super().__init__()
         try:
-            self.original_image = pygame.image.load("assets/images/player_helicopter.png").convert_alpha()
+            self.original_image = load_image("player_helicopter.png")
         except pygame.error as e:
             print(f"Error loading player_helicopter.png: {e}")
             self.original_image = pygame.Surface([50, 20])
             self.original_image.fill(RED)
         self.image = self.original_image.copy()
         self.rect = self.image.get_rect()
-        self.rect.center = (SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2)
+        self.rect.center = (spawn_x, spawn_y)
         self.speed = 5
+        self.input_bits = 0
         self.velocity_x = 0
         self.velocity_y = 0
         self.vulcan_bullets = pygame.sprite.Group()
@@ -485,27 +707,31 @@ class Player(pygame.sprite.Sprite):
         self.last_direction_y = 0
 
     def handle_input(self, keys):
-        self.velocity_x = 0; self.velocity_y = 0
+        self.apply_input(input_bits_from_keys(keys))
+
+    def apply_input(self, bits):
+        self.input_bits = bits
+        self.velocity_x, self.velocity_y = movement_velocity(bits, self.speed)
         current_direction_x = 0; current_direction_y = 0
-        if keys[pygame.K_LEFT] or keys[pygame.K_a]: self.velocity_x = -self.speed; current_direction_x = -1
-        if keys[pygame.K_RIGHT] or keys[pygame.K_d]: self.velocity_x = self.speed; current_direction_x = 1
-        if keys[pygame.K_UP] or keys[pygame.K_w]: self.velocity_y = -self.speed; current_direction_y = -1
-        if keys[pygame.K_DOWN] or keys[pygame.K_s]: self.velocity_y = self.speed; current_direction_y = 1
+        if bits & INPUT_LEFT: current_direction_x = -1
+        if bits & INPUT_RIGHT: current_direction_x = 1
+        if bits & INPUT_UP: current_direction_y = -1
+        if bits & INPUT_DOWN: current_direction_y = 1
         if current_direction_x != 0 or current_direction_y != 0:
             self.last_direction_x = current_direction_x
             self.last_direction_y = current_direction_y
         if self.velocity_x != 0 and self.velocity_y != 0:
-            self.velocity_x /= 1.414; self.velocity_y /= 1.414
             self.last_direction_x = self.velocity_x / self.speed
             self.last_direction_y = self.velocity_y / self.speed
-        if keys[pygame.K_SPACE]: self.shoot_vulcan()
-        if keys[pygame.K_m]: self.shoot_missile()
+        if bits & INPUT_VULCAN: self.shoot_vulcan()
+        if bits & INPUT_MISSILE: self.shoot_missile()
 
     def shoot_vulcan(self):
-        current_time = pygame.time.get_ticks()
+        current_time = get_game_ticks()
         if current_time - self.last_vulcan_shot_time > self.vulcan_shoot_delay:
             self.last_vulcan_shot_time = current_time
             play_sound(sound_vulcan_fire)
+            record_event(EVENT_SHOT, WEAPON_VULCAN)
             proj_dx = self.last_direction_x; proj_dy = self.last_direction_y
             if proj_dx == 0 and proj_dy == 0: proj_dx = 1
             if not (abs(proj_dx)==1 and proj_dy==0) and not (abs(proj_dy)==1 and proj_dx==0) and not (proj_dx==0 and proj_dy==0):
@@ -515,10 +741,11 @@ class Player(pygame.sprite.Sprite):
             self.vulcan_bullets.add(bullet)
 
     def shoot_missile(self):
-        current_time = pygame.time.get_ticks()
+        current_time = get_game_ticks()
         if current_time - self.last_missile_shot_time > self.missile_shoot_delay:
             self.last_missile_shot_time = current_time
             play_sound(sound_missile_fire)
+            record_event(EVENT_SHOT, WEAPON_MISSILE)
             proj_dx = self.last_direction_x; proj_dy = self.last_direction_y
             if proj_dx == 0 and proj_dy == 0: proj_dx = 1
             if not (abs(proj_dx)==1 and proj_dy==0) and not (abs(proj_dy)==1 and proj_dx==0) and not (proj_dx==0 and proj_dy==0):
@@ -527,28 +754,28 @@ class Player(pygame.sprite.Sprite):
             missile = Missile(self.rect.centerx, self.rect.centery, proj_dx, proj_dy)
             self.missiles.add(missile)
 
-    def update(self):
+    def move(self):
         self.rect.x += self.velocity_x; self.rect.y += self.velocity_y
+        clamp_to_screen(self.rect)
+
+    def update(self):
+        self.move()
         if self.is_invulnerable:
-            current_time = pygame.time.get_ticks()
+            current_time = get_game_ticks()
             if current_time - self.last_hit_time > self.invulnerability_duration:
                 self.is_invulnerable = False; self.image = self.original_image.copy()
             else:
-                self.flash_timer += clock.get_time()
+                self.flash_timer += FIXED_TIMESTEP_MS
                 if self.flash_timer > self.flash_duration:
                     self.flash_timer = 0
                     if self.image is self.original_image:
                         temp_flash_image = self.original_image.copy(); temp_flash_image.fill(LIGHT_RED); self.image = temp_flash_image
                     else: self.image = self.original_image.copy()
         else: self.image = self.original_image.copy()
-        if self.rect.left < 0: self.rect.left = 0
-        if self.rect.right > SCREEN_WIDTH: self.rect.right = SCREEN_WIDTH
-        if self.rect.top < 0: self.rect.top = 0
-        if self.rect.bottom > SCREEN_HEIGHT: self.rect.bottom = SCREEN_HEIGHT
         self.vulcan_bullets.update(); self.missiles.update()
 
     def take_damage(self, amount):
-        current_time = pygame.time.get_ticks()
+        current_time = get_game_ticks()
         if not self.is_invulnerable:
             self.health -= amount
             play_sound(sound_player_damage)
@@ -556,12 +783,40 @@ class Player(pygame.sprite.Sprite):
             # print(f"Player health: {self.health}") # Removed for cleanup
             self.is_invulnerable = True; self.last_hit_time = current_time; self.flash_timer = 0
 
-    def draw(self, surface):
-        surface.blit(self.image, self.rect)
-        self.vulcan_bullets.draw(surface); self.missiles.draw(surface)
-        if self.health > 0:
-             pygame.draw.rect(surface, RED, (10, 10, self.max_health * 2, 20))
-             pygame.draw.rect(surface, GREEN, (10, 10, self.health * 2, 20))
+    def draw(self, render_queue, alpha=1.0, show_health_bar=True):
+        if self.health > 0: render_queue.submit(LAYER_PLAYER, self.image, interpolated_topleft(self, alpha))
+        for bullet in self.vulcan_bullets: bullet.draw(render_queue, alpha)
+        for missile in self.missiles: missile.draw(render_queue, alpha)
+        if show_health_bar and self.health > 0:
+             render_queue.submit(LAYER_HUD, health_bar_surface(self.max_health * 2, 20, self.health / self.max_health, GREEN, RED), (10, 10))
+
+# HUD
+class Hud:
+    def __init__(self):
+        self.font = pygame.font.Font(None, 36)
+        self.frames_since_render = 0
+        self.shown_score = None
+        self.shown_stage = None
+        self.score_surface = None
+        self.stage_surface = None
+        self.show_render_stats = False
+
+    def draw(self, render_queue, score, stage):
+        # Text is re-rendered only when it changed, and at most every hud_refresh_frames frames
+        self.frames_since_render += 1
+        changed = score != self.shown_score or stage != self.shown_stage
+        if self.score_surface is None or (changed and self.frames_since_render >= quality.hud_refresh_frames):
+            self.frames_since_render = 0
+            self.shown_score = score; self.shown_stage = stage
+            self.score_surface = self.font.render(f"Score: {score}", True, WHITE)
+            self.stage_surface = self.font.render(f"Stage: {stage}", True, WHITE)
+        render_queue.submit(LAYER_HUD, self.score_surface, (SCREEN_WIDTH - self.score_surface.get_width() - 10, 10))
+        render_queue.submit(LAYER_HUD, self.stage_surface, (10, SCREEN_HEIGHT - self.stage_surface.get_height() - 10))
+        if self.show_render_stats: # Toggled with F3; shows the previous frame's numbers
+            stats_surface = self.font.render(f"Draw calls: {render_queue.draw_calls}  Blits: {render_queue.blit_count}  Flush: {render_queue.flush_ms:.2f}ms", True, WHITE)
+            render_queue.submit(LAYER_HUD, stats_surface, (10, SCREEN_HEIGHT - 2 * stats_surface.get_height() - 14))
+
+hud = Hud()
 
 # Sprite Groups
 all_sprites = pygame.sprite.Group()
@@ -572,31 +827,44 @@ enemy_bullets = pygame.sprite.Group()
 battleship_group = pygame.sprite.GroupSingle() # For the single battleship
 
 # Create Player
-player = Player()
+player = Player() # The local player; co-op adds remote players after it
+players = [player]
 all_sprites.add(player)
+MAX_PLAYERS = 4
+PLAYER_SPAWN_OFFSETS = [0, -80, 80, 160] # Horizontal offset from the screen centre per player slot
+
+def player_spawn_position(slot):
+    return (SCREEN_WIDTH // 2 + PLAYER_SPAWN_OFFSETS[slot], SCREEN_HEIGHT // 2)
 
-# Predefined positions (can be adjusted or made dynamic later)
-warehouse_positions = [(150, SCREEN_HEIGHT - 70), (400, SCREEN_HEIGHT - 70), (650, SCREEN_HEIGHT - 70),
-                       (250, SCREEN_HEIGHT - 170), (550, SCREEN_HEIGHT - 170)]
-aa_gun_positions = [(150, SCREEN_HEIGHT - 30), (400, SCREEN_HEIGHT - 30), (650, SCREEN_HEIGHT - 30)]
+def nearest_player_center(pos, candidates):
+    # Enemies target the closest living player; falls back to the local player when none are alive
+    if not candidates: return player.rect.center
+    return min(candidates, key=lambda p: (p.rect.centerx - pos[0])**2 + (p.rect.centery - pos[1])**2).rect.center
 
 # Game state variables
 score = 0
 game_start_time = 0
 current_stage = 1
-BATTLESHIP_SPAWN_TIME = 300000
-# BATTLESHIP_SPAWN_TIME_DEBUG = 45000 # for testing warning (45s)
+stage_plan = stage_table.plan(current_stage)
+stage_spawn_index = 0 # Next entry of stage_plan.spawns to create
 BATTLESHIP_WARNING_LEAD_TIME = 30000 # 30 seconds before spawn
 BATTLESHIP_WARNING_DURATION = 5000 # Display warning for 5 seconds
 
+GAME_STATES = ("get_ready", "playing", "stage_clear", "game_over")
 game_state = "get_ready" # Start with "get_ready" state
 stage_clear_message_display_time = 0
 STAGE_CLEAR_DURATION = 3000
+stage_clear_text = pygame.font.Font(None, 74).render("Stage Clear!", True, GREEN)
+stage_clear_rect = stage_clear_text.get_rect(center=(SCREEN_WIDTH/2, SCREEN_HEIGHT/2))
 GET_READY_DURATION = 2000 # 2 seconds for "Get Ready!"
 get_ready_start_time = 0
 battleship_warning_shown_this_stage = False
 battleship_approaching_message_active = False
 battleship_approaching_message_end_time = 0
+session_start_time = 0
+session_recorded = False
+session_key = None # ScoreStore key of the current run once it has been recorded
+score_store = None # ScoreStore, opened at startup unless this is a co-op client or benchmark
 
 
 # Single instance of Battleship, initially inactive
@@ -605,12 +873,16 @@ battleship_group.add(battleship) # Add to its own group
 
 def init_game_values(is_new_game_session=False):
     global game_start_time, score, current_stage, get_ready_start_time, battleship_warning_shown_this_stage, battleship_approaching_message_active
+    global session_start_time, session_recorded, session_key
     if is_new_game_session:
         score = 0
         current_stage = 1
+        session_start_time = get_game_ticks()
+        session_recorded = False
+        session_key = None
 
-    game_start_time = pygame.time.get_ticks() # This is for overall stage time, including "Get Ready"
-    get_ready_start_time = pygame.time.get_ticks() # Specifically for the "Get Ready" message timing
+    game_start_time = get_game_ticks() # This is for overall stage time, including "Get Ready"
+    get_ready_start_time = get_game_ticks() # Specifically for the "Get Ready" message timing
     battleship_warning_shown_this_stage = False
     battleship_approaching_message_active = False
 
@@ -619,8 +891,42 @@ def init_game_values(is_new_game_session=False):
         if battleship in all_sprites:
             all_sprites.remove(battleship)
 
+# Stage Timeline
+def spawn_entity(kind, x, y):
+    if kind == "warehouse":
+        warehouse = Warehouse(x, y, initial_health=stage_plan.warehouse_health)
+        warehouses.add(warehouse); all_sprites.add(warehouse)
+    elif kind == "aa_gun":
+        aa_gun = AAGun(x, y, fire_rate_ms=stage_plan.aagun_fire_rate_ms, initial_health=stage_plan.aagun_health)
+        aa_gun.set_enemy_bullets_group(enemy_bullets); aa_guns.add(aa_gun); all_sprites.add(aa_gun)
+    else:
+        jet = FighterJet(x, y, player.speed, enemy_bullets, initial_health=stage_plan.fighter_health)
+        fighter_jets.add(jet); all_sprites.add(jet)
+
+def spawn_due_entities(elapsed_ms):
+    # Creates every spawn whose time has come. Once everything on screen is destroyed the next wave
+    # is brought forward, so clearing a wave early never leaves the player waiting on an empty stage.
+    global stage_spawn_index
+    spawns = stage_plan.spawns
+    if stage_spawn_index < len(spawns) and not warehouses and not aa_guns and not fighter_jets:
+        elapsed_ms = max(elapsed_ms, spawns[stage_spawn_index][0])
+    while stage_spawn_index < len(spawns) and spawns[stage_spawn_index][0] <= elapsed_ms:
+        _, kind, x, y = spawns[stage_spawn_index]
+        spawn_entity(kind, x, y)
+        stage_spawn_index += 1
+
+def reload_stage_data():
+    # Called when the stage files change on disk; a stage already in progress keeps its plan
+    global stage_table
+    try:
+        stage_table = load_stage_table(stage_table.directory, (SCREEN_WIDTH, SCREEN_HEIGHT))
+        print("Stage data reloaded; changes apply from the next stage")
+    except StageDataError as e: # Keep playing on the old tables
+        print(f"Stage data not reloaded: {e}")
+
 def reset_stage(is_first_load=False):
     global warehouses, player, all_sprites, aa_guns, enemy_bullets, fighter_jets, current_stage, score
+    global stage_plan, stage_spawn_index
     if not is_first_load:
         current_stage += 1
         print(f"Advancing to Stage: {current_stage}")
@@ -629,6 +935,7 @@ def reset_stage(is_first_load=False):
         score = 0
 
     init_game_values(is_new_game_session=is_first_load)
+    if is_first_load: rewind_buffer.clear() # No rewinding into a previous game session
 
     # Clear existing sprites before repopulating for the new stage
     player.kill() # Remove old player explicitly
@@ -637,27 +944,18 @@ def reset_stage(is_first_load=False):
     warehouses.empty(); aa_guns.empty(); fighter_jets.empty(); enemy_bullets.empty()
     # battleship_group still holds the battleship object, just inactive.
 
-    player.__init__() # Re-initialize player state
-    all_sprites.add(player)
+    for slot, stage_player in enumerate(players):
+        stage_player.__init__(*player_spawn_position(slot)) # Re-initialize player state
+        all_sprites.add(stage_player)
 
-    current_warehouse_health = BASE_WAREHOUSE_HEALTH + (current_stage - 1) * WAREHOUSE_HEALTH_INCREASE_PER_STAGE
-    current_aagun_health = BASE_AAGUN_HEALTH + (current_stage - 1) * AAGUN_HEALTH_INCREASE_PER_STAGE
-    current_aagun_fire_rate = max(MIN_AAGUN_FIRE_RATE_MS, BASE_AAGUN_FIRE_RATE_MS - (current_stage - 1) * AAGUN_FIRE_RATE_DECREASE_PER_STAGE)
-    current_fighter_health = BASE_FIGHTER_HEALTH + (current_stage - 1) * FIGHTER_HEALTH_INCREASE_PER_STAGE
-    current_battleship_max_health = BASE_BATTLESHIP_HEALTH + (current_stage - 1) * BATTLESHIP_HEALTH_INCREASE_PER_STAGE
-
-    for pos in warehouse_positions:
-        warehouse = Warehouse(pos[0], pos[1], initial_health=current_warehouse_health)
-        warehouses.add(warehouse); all_sprites.add(warehouse)
-    for pos in aa_gun_positions:
-        aa_gun = AAGun(pos[0], pos[1], fire_rate_ms=current_aagun_fire_rate, initial_health=current_aagun_health)
-        aa_gun.set_enemy_bullets_group(enemy_bullets); aa_guns.add(aa_gun); all_sprites.add(aa_gun)
-    jet = FighterJet(SCREEN_WIDTH // 2, 50, player.speed, enemy_bullets, initial_health=current_fighter_health)
-    fighter_jets.add(jet); all_sprites.add(jet)
+    # Only the opening wave is created now; later waves spawn from update_simulation when due
+    stage_plan = stage_table.plan(current_stage)
+    stage_spawn_index = 0
+    spawn_due_entities(0)
 
     battleship.is_active = False
     battleship.rect.topleft = (-battleship.width, SCREEN_HEIGHT // 3)
-    battleship.max_health = current_battleship_max_health
+    battleship.max_health = stage_plan.battleship_health
     battleship.health = battleship.max_health
     if battleship in all_sprites:
         all_sprites.remove(battleship)
@@ -665,58 +963,276 @@ def reset_stage(is_first_load=False):
     # Start with "get_ready" state for the new stage
     global game_state, get_ready_start_time # Ensure we modify the global game_state
     game_state = "get_ready"
-    get_ready_start_time = pygame.time.get_ticks()
+    get_ready_start_time = get_game_ticks()
+    global pending_audit_label
+    if auditor is not None: pending_audit_label = f"new game, stage {current_stage}" if is_first_load else f"stage {current_stage}"
+
+
+# Game State Snapshots
+# A snapshot is the whole simulation packed into a little-endian binary record: a header with the
+# globals from the game state variables, then one fixed-size record per entity, grouped by kind.
+SNAPSHOT_HEADER = struct.Struct("<diHBiii??iHHHHHHH")
+PLAYER_RECORD = struct.Struct("<hhddddi?idii")
+PROJECTILE_RECORD = struct.Struct("<hhdd")
+ENEMY_BULLET_RECORD = struct.Struct("<hhddB?")
+WAREHOUSE_RECORD = struct.Struct("<hhii")
+AAGUN_RECORD = struct.Struct("<hhiiii")
+FIGHTER_JET_RECORD = struct.Struct("<hhddddddiiii")
+BATTLESHIP_RECORD = struct.Struct("<hhii?bi??")
+TURRET_RECORD = struct.Struct("<ii")
+
+def capture_snapshot():
+    parts = [SNAPSHOT_HEADER.pack(
+        sim_time_ms, score, current_stage, GAME_STATES.index(game_state), game_start_time, get_ready_start_time,
+        stage_clear_message_display_time, battleship_warning_shown_this_stage, battleship_approaching_message_active,
+        battleship_approaching_message_end_time, len(player.vulcan_bullets), len(player.missiles), len(warehouses),
+        len(aa_guns), len(fighter_jets), len(enemy_bullets), stage_spawn_index)]
+    parts.append(PLAYER_RECORD.pack(
+        player.rect.x, player.rect.y, player.velocity_x, player.velocity_y, player.last_direction_x, player.last_direction_y,
+        player.health, player.is_invulnerable, player.last_hit_time, player.flash_timer,
+        player.last_vulcan_shot_time, player.last_missile_shot_time))
+    for proj in player.vulcan_bullets: parts.append(PROJECTILE_RECORD.pack(proj.rect.x, proj.rect.y, proj.velocity_x, proj.velocity_y))
+    for proj in player.missiles: parts.append(PROJECTILE_RECORD.pack(proj.rect.x, proj.rect.y, proj.velocity_x, proj.velocity_y))
+    for wh in warehouses: parts.append(WAREHOUSE_RECORD.pack(wh.rect.x, wh.rect.y, wh.health, wh.max_health))
+    for gun in aa_guns:
+        parts.append(AAGUN_RECORD.pack(gun.rect.centerx, gun.rect.centery, gun.fire_rate, gun.last_shot_time, gun.health, gun.max_health))
+    for jet in fighter_jets:
+        parts.append(FIGHTER_JET_RECORD.pack(
+            jet.rect.x, jet.rect.y, jet.image_angle_deg, jet.current_angle_rad, jet.velocity_x, jet.velocity_y,
+            jet.speed, jet.turn_speed_rad, jet.health, jet.max_health, jet.fire_rate, jet.last_shot_time))
+    for bullet in enemy_bullets:
+        parts.append(ENEMY_BULLET_RECORD.pack(bullet.rect.x, bullet.rect.y, bullet.velocity_x, bullet.velocity_y, bullet.source, bullet in all_sprites))
+    parts.append(BATTLESHIP_RECORD.pack(
+        battleship.rect.x, battleship.rect.y, battleship.health, battleship.max_health, battleship.is_active,
+        battleship.direction, -1 if battleship.turn_time is None else battleship.turn_time,
+        battleship in all_sprites, battleship in battleship_group))
+    for turret in battleship.turrets: parts.append(TURRET_RECORD.pack(turret['last_shot'], turret['fire_rate']))
+    return b"".join(parts)
+
+def restore_snapshot(data):
+    global sim_time_ms, score, current_stage, game_state, game_start_time, get_ready_start_time
+    global stage_clear_message_display_time, battleship_warning_shown_this_stage, battleship_approaching_message_active
+    global battleship_approaching_message_end_time, stage_plan, stage_spawn_index
+    (sim_time_ms, score, current_stage, state_index, game_start_time, get_ready_start_time,
+     stage_clear_message_display_time, battleship_warning_shown_this_stage, battleship_approaching_message_active,
+     battleship_approaching_message_end_time, vulcan_count, missile_count, warehouse_count,
+     aagun_count, jet_count, enemy_bullet_count, stage_spawn_index) = SNAPSHOT_HEADER.unpack_from(data, 0)
+    game_state = GAME_STATES[state_index]
+    if stage_table.plan(current_stage).number != stage_plan.number: # Rewound across a stage change
+        stage_plan = stage_table.plan(current_stage) # Within a stage the plan in progress is kept, even after a reload
+    offset = SNAPSHOT_HEADER.size
+
+    for s in all_sprites: s.kill()
+    warehouses.empty(); aa_guns.empty(); fighter_jets.empty(); enemy_bullets.empty()
+    player.vulcan_bullets.empty(); player.missiles.empty()
+
+    (player.rect.x, player.rect.y, player.velocity_x, player.velocity_y, player.last_direction_x, player.last_direction_y,
+     player.health, player.is_invulnerable, player.last_hit_time, player.flash_timer,
+     player.last_vulcan_shot_time, player.last_missile_shot_time) = PLAYER_RECORD.unpack_from(data, offset)
+    offset += PLAYER_RECORD.size
+    player.image = player.original_image.copy()
+    player.prev_center = None
+    all_sprites.add(player)
 
+    for group, projectile_class, count in ((player.vulcan_bullets, Bullet, vulcan_count), (player.missiles, Missile, missile_count)):
+        for x, y, velocity_x, velocity_y in PROJECTILE_RECORD.iter_unpack(data[offset:offset + count * PROJECTILE_RECORD.size]):
+            proj = projectile_class(0, 0, 0, 0)
+            proj.rect.topleft = (x, y); proj.velocity_x = velocity_x; proj.velocity_y = velocity_y
+            group.add(proj)
+        offset += count * PROJECTILE_RECORD.size
+
+    for x, y, health, max_health in WAREHOUSE_RECORD.iter_unpack(data[offset:offset + warehouse_count * WAREHOUSE_RECORD.size]):
+        wh = Warehouse(x, y, initial_health=max_health)
+        wh.health = health
+        warehouses.add(wh); all_sprites.add(wh)
+    offset += warehouse_count * WAREHOUSE_RECORD.size
+
+    for x, y, fire_rate, last_shot_time, health, max_health in AAGUN_RECORD.iter_unpack(data[offset:offset + aagun_count * AAGUN_RECORD.size]):
+        gun = AAGun(x, y, fire_rate_ms=fire_rate, initial_health=max_health)
+        gun.last_shot_time = last_shot_time; gun.health = health
+        gun.set_enemy_bullets_group(enemy_bullets); aa_guns.add(gun); all_sprites.add(gun)
+    offset += aagun_count * AAGUN_RECORD.size
+
+    for record in FIGHTER_JET_RECORD.iter_unpack(data[offset:offset + jet_count * FIGHTER_JET_RECORD.size]):
+        x, y, image_angle_deg = record[:3]
+        jet = FighterJet(0, 0, player.speed, enemy_bullets, initial_health=record[9])
+        (jet.current_angle_rad, jet.velocity_x, jet.velocity_y, jet.speed, jet.turn_speed_rad,
+         jet.health, jet.max_health, jet.fire_rate, jet.last_shot_time) = record[3:]
+        jet.image_angle_deg = image_angle_deg
+        if image_angle_deg: jet.image = pygame.transform.rotate(jet.original_image, image_angle_deg)
+        jet.rect = jet.image.get_rect(topleft=(x, y))
+        fighter_jets.add(jet); all_sprites.add(jet)
+    offset += jet_count * FIGHTER_JET_RECORD.size
+
+    for x, y, velocity_x, velocity_y, source, in_all_sprites in ENEMY_BULLET_RECORD.iter_unpack(data[offset:offset + enemy_bullet_count * ENEMY_BULLET_RECORD.size]):
+        bullet = EnemyBullet(0, 0, source=source)
+        bullet.rect.topleft = (x, y); bullet.velocity_x = velocity_x; bullet.velocity_y = velocity_y
+        enemy_bullets.add(bullet)
+        if in_all_sprites: all_sprites.add(bullet)
+    offset += enemy_bullet_count * ENEMY_BULLET_RECORD.size
+
+    (battleship.rect.x, battleship.rect.y, battleship.health, battleship.max_health, battleship.is_active,
+     battleship.direction, turn_time, in_all_sprites, in_battleship_group) = BATTLESHIP_RECORD.unpack_from(data, offset)
+    offset += BATTLESHIP_RECORD.size
+    battleship.turn_time = None if turn_time < 0 else turn_time
+    battleship.prev_center = None
+    if in_all_sprites: all_sprites.add(battleship)
+    if in_battleship_group: battleship_group.add(battleship)
+    else: battleship_group.empty()
+    for turret, (last_shot, fire_rate) in zip(battleship.turrets, TURRET_RECORD.iter_unpack(data[offset:])):
+        turret['last_shot'] = last_shot; turret['fire_rate'] = fire_rate
+
+def xor_bytes(data, reference):
+    # reference is truncated or zero-padded to len(data), so xor_bytes(xor_bytes(a, b), b) == a
+    reference = reference[:len(data)].ljust(len(data), b"\0")
+    return (int.from_bytes(data, "little") ^ int.from_bytes(reference, "little")).to_bytes(len(data), "little")
+
+# Rewind Buffer
+class RewindBuffer:
+    # Ring buffer of the most recent snapshots. Each entry stores the XOR against the previous snapshot,
+    # zlib-compressed; every keyframe_interval entries a full snapshot is stored so that decoding any
+    # entry only replays the deltas since the last keyframe.
+    def __init__(self, seconds=10, snapshots_per_second=FPS, keyframe_interval=30):
+        self.entries = deque(maxlen=int(seconds * snapshots_per_second))
+        self.keyframe_interval = keyframe_interval
+        self.last_snapshot = None
+        self.deltas_since_keyframe = 0
+
+    def __len__(self): return len(self.entries)
+
+    def clear(self):
+        self.entries.clear()
+        self.last_snapshot = None
+
+    def push(self, snapshot):
+        if self.last_snapshot is None or self.deltas_since_keyframe >= self.keyframe_interval:
+            self.entries.append((True, zlib.compress(snapshot, 1)))
+            self.deltas_since_keyframe = 0
+        else:
+            self.entries.append((False, zlib.compress(xor_bytes(snapshot, self.last_snapshot), 1)))
+            self.deltas_since_keyframe += 1
+        self.last_snapshot = snapshot
+
+    def size_bytes(self):
+        return sum(len(payload) for _, payload in self.entries)
+
+    def get(self, steps_back=0):
+        # Returns the snapshot taken steps_back pushes ago, or None if it is no longer decodable
+        index = len(self.entries) - 1 - steps_back
+        if index < 0: return None
+        keyframe_index = index
+        while keyframe_index >= 0 and not self.entries[keyframe_index][0]: keyframe_index -= 1
+        if keyframe_index < 0: return None # Its keyframe has already been evicted
+        snapshot = zlib.decompress(self.entries[keyframe_index][1])
+        for i in range(keyframe_index + 1, index + 1):
+            snapshot = xor_bytes(zlib.decompress(self.entries[i][1]), snapshot)
+        return snapshot
+
+    def rewind(self, steps_back):
+        # Drops everything newer than steps_back and returns the snapshot to resume from
+        snapshot = self.get(steps_back)
+        while snapshot is None and steps_back > 0: # Fall back to the oldest decodable snapshot
+            steps_back -= 1
+            snapshot = self.get(steps_back)
+        if snapshot is None: return None
+        for _ in range(steps_back): self.entries.pop()
+        self.last_snapshot = snapshot
+        self.deltas_since_keyframe = 0
+        for is_keyframe, _ in reversed(self.entries):
+            if is_keyframe: break
+            self.deltas_since_keyframe += 1
+        return snapshot
+
+REWIND_SECONDS = 3
+rewind_buffer = RewindBuffer()
+
+def rewind_game(seconds=REWIND_SECONDS):
+    if len(players) > 1: return
+    snapshot = rewind_buffer.rewind(int(seconds * FPS))
+    if snapshot is None: return
+    restore_snapshot(snapshot)
+    global session_recorded
+    session_recorded = False # The rewound attempt carries on; when it ends it replaces the session recorded before
+    record_event(EVENT_REWIND, value=get_game_ticks()) # Lets telemetry queries drop the events that are about to be replayed
+    print(f"Rewound to {sim_time_ms / 1000:.1f}s (score {score})")
 
 reset_stage(is_first_load=True)
 
-# Main Game Loop
-while running:
-    dt = clock.tick(FPS) / 1000.0
-    current_ticks = pygame.time.get_ticks()
-
+def remember_positions():
+    for each_player in players:
+        remember_position(each_player)
+        for group in (each_player.vulcan_bullets, each_player.missiles):
+            for sprite in group: remember_position(sprite)
+    for group in (fighter_jets, enemy_bullets):
+        for sprite in group: remember_position(sprite)
+    if battleship.is_active: remember_position(battleship)
+
+def handle_events():
+    global running, game_state, game_start_time
     for event in pygame.event.get():
         if event.type == pygame.QUIT:
             running = False
+        if coop_client is not None: continue # The server owns the game state
 
         if game_state == "game_over":
             if event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_q: running = False
                 if event.key == pygame.K_r: reset_stage(is_first_load=True); # game_state becomes "get_ready" via reset_stage
+                if event.key == pygame.K_BACKSPACE: rewind_game() # Instant retry from a few seconds back
         elif game_state == "get_ready":
             if event.type == pygame.KEYDOWN: # Allow skipping "Get Ready"
                  if event.key == pygame.K_RETURN or event.key == pygame.K_SPACE:
                       game_state = "playing"
-                      game_start_time = pygame.time.get_ticks() # Actual gameplay starts now
+                      game_start_time = get_game_ticks() # Actual gameplay starts now
+                      record_event(EVENT_STAGE_START)
         elif game_state == "playing":
-            if event.type == pygame.USEREVENT + 1:
-                if battleship.is_active: battleship.direction *= -1
-
-    keys = pygame.key.get_pressed()
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_BACKSPACE: rewind_game()
+        if event.type == pygame.KEYDOWN and event.key == pygame.K_F3: hud.show_render_stats = not hud.show_render_stats
+
+def update_simulation(keys=None):
+    # Advances the game by exactly one fixed timestep. keys drives the local player; remote
+    # players' input_bits are set by the co-op server before each step.
+    global sim_time_ms, running, game_state, game_start_time, score, stage_clear_message_display_time
+    global battleship_warning_shown_this_stage, battleship_approaching_message_active, battleship_approaching_message_end_time
+    global pending_audit_label
+    if pending_audit_label is not None:
+        audit_stage_transition(pending_audit_label); pending_audit_label = None
+    sim_time_ms += FIXED_TIMESTEP_MS
+    current_ticks = get_game_ticks()
 
     if game_state == "get_ready":
         if current_ticks - get_ready_start_time > GET_READY_DURATION:
             game_state = "playing"
-            game_start_time = pygame.time.get_ticks() # Actual gameplay starts now
+            game_start_time = get_game_ticks() # Actual gameplay starts now
+            record_event(EVENT_STAGE_START)
             battleship_warning_shown_this_stage = False # Reset warning for new "playing" session
             battleship_approaching_message_active = False
 
+    elif game_state == "stage_clear":
+        if current_ticks - stage_clear_message_display_time > STAGE_CLEAR_DURATION:
+            reset_stage(); # game_state becomes "get_ready"
 
     elif game_state == "playing":
-        if keys[pygame.K_ESCAPE]: running = False
-        player.handle_input(keys)
+        if keys is not None:
+            if keys[pygame.K_ESCAPE]: running = False
+            player.input_bits = input_bits_from_keys(keys)
+        living_players = [p for p in players if p.health > 0]
+        for each_player in players: each_player.apply_input(each_player.input_bits if each_player.health > 0 else 0)
+
+        spawn_due_entities(current_ticks - game_start_time)
 
         # Updates
-        player.update()
+        for each_player in players: each_player.update()
         warehouses.update()
         aa_guns.update(player.rect.center)
-        fighter_jets.update(player.rect.center)
+        for jet in fighter_jets: jet.update(nearest_player_center(jet.rect.center, living_players))
         enemy_bullets.update()
 
         # Battleship Warning and Spawning
         time_since_stage_start = current_ticks - game_start_time
-        if not battleship.is_active and battleship.health > 0 and not battleship_warning_shown_this_stage:
-            time_to_battleship_spawn = BATTLESHIP_SPAWN_TIME - time_since_stage_start
+        battleship_at_ms = stage_plan.battleship_at_ms
+        if battleship_at_ms is not None and not battleship.is_active and battleship.health > 0 and not battleship_warning_shown_this_stage:
+            time_to_battleship_spawn = battleship_at_ms - time_since_stage_start
             if 0 < time_to_battleship_spawn <= BATTLESHIP_WARNING_LEAD_TIME:
                 battleship_approaching_message_active = True
                 battleship_approaching_message_end_time = current_ticks + BATTLESHIP_WARNING_DURATION
@@ -725,51 +1241,59 @@ while running:
         if battleship_approaching_message_active and current_ticks > battleship_approaching_message_end_time:
             battleship_approaching_message_active = False
 
-        if not battleship.is_active and battleship.health > 0 and (time_since_stage_start > BATTLESHIP_SPAWN_TIME):
+        if battleship_at_ms is not None and not battleship.is_active and battleship.health > 0 and time_since_stage_start > battleship_at_ms:
             battleship.activate()
+            record_event(EVENT_BATTLESHIP_SPAWN, value=time_since_stage_start)
             if battleship not in all_sprites : all_sprites.add(battleship)
             battleship_approaching_message_active = False # Ensure warning is off once spawned
 
         if battleship.is_active:
-            battleship.update(player.rect.center)
+            battleship.update(nearest_player_center(battleship.rect.center, living_players))
             if battleship.health <= 0 and battleship in all_sprites:
                 print(f"Battleship Destroyed! +1000 points!")
                 play_sound(sound_battleship_explosion)
                 score += 1000
+                record_event(EVENT_KILL, TARGET_BATTLESHIP, 1000)
+                record_event(EVENT_BATTLESHIP_KILL, value=time_since_stage_start)
                 battleship.kill()
                 battleship.is_active = False
 
         # Collision Detections
-        for proj_group in [player.vulcan_bullets, player.missiles]:
+        for proj_group in [group for p in players for group in (p.vulcan_bullets, p.missiles)]:
             for proj in list(proj_group):
                 hit_wh = pygame.sprite.spritecollide(proj, warehouses, False)
                 for wh in hit_wh:
-                    wh.take_damage(proj.damage); proj.kill()
-                    if wh.is_destroyed() and wh.health == 0: score += 10; play_sound(sound_explosion_small)
+                    wh.take_damage(proj.damage); proj.kill(); record_event(EVENT_HIT, TARGET_WAREHOUSE, proj.damage)
+                    if wh.is_destroyed() and wh.health == 0: score += 10; play_sound(sound_explosion_small); record_event(EVENT_KILL, TARGET_WAREHOUSE, 10)
                 if not proj.alive(): continue
                 hit_aa = pygame.sprite.spritecollide(proj, aa_guns, False)
                 for aa in hit_aa:
-                    aa.take_damage(proj.damage); proj.kill()
-                    if aa.is_destroyed() and aa.health == 0: score += 50; play_sound(sound_explosion_small)
+                    aa.take_damage(proj.damage); proj.kill(); record_event(EVENT_HIT, TARGET_AAGUN, proj.damage)
+                    if aa.is_destroyed() and aa.health == 0: score += 50; play_sound(sound_explosion_small); record_event(EVENT_KILL, TARGET_AAGUN, 50)
                 if not proj.alive(): continue
                 hit_jet = pygame.sprite.spritecollide(proj, fighter_jets, False)
                 for jet_hit in hit_jet:
-                    jet_hit.take_damage(proj.damage); proj.kill()
-                    if jet_hit.is_destroyed() and jet_hit.health == 0: score += 100; play_sound(sound_explosion_small)
+                    jet_hit.take_damage(proj.damage); proj.kill(); record_event(EVENT_HIT, TARGET_FIGHTER_JET, proj.damage)
+                    if jet_hit.is_destroyed() and jet_hit.health == 0: score += 100; play_sound(sound_explosion_small); record_event(EVENT_KILL, TARGET_FIGHTER_JET, 100)
                 if not proj.alive(): continue
                 if battleship.is_active and pygame.sprite.collide_rect(proj, battleship):
-                    battleship.take_damage(proj.damage); proj.kill()
+                    battleship.take_damage(proj.damage); proj.kill(); record_event(EVENT_HIT, TARGET_BATTLESHIP, proj.damage)
 
         for bullet in enemy_bullets:
-            if pygame.sprite.collide_rect(bullet, player):
-                player.take_damage(bullet.damage); bullet.kill()
-                if player.health <= 0:
-                    print(f"Game Over - Player health depleted. Final Score: {score}")
-                    play_sound(sound_game_over)
-                    game_state = "game_over"
+            for target_player in living_players:
+                if target_player.health > 0 and pygame.sprite.collide_rect(bullet, target_player):
+                    health_before = target_player.health
+                    target_player.take_damage(bullet.damage); bullet.kill()
+                    if target_player.health != health_before: record_event(EVENT_DAMAGE_TAKEN, bullet.source, health_before - target_player.health)
                     break
-            if game_state == "game_over": break
-        if game_state == "game_over": continue
+        if all(p.health <= 0 for p in players):
+            print(f"Game Over - Player health depleted. Final Score: {score}")
+            play_sound(sound_game_over)
+            record_event(EVENT_GAME_OVER, value=score)
+            record_session()
+            if telemetry is not None: telemetry.flush()
+            game_state = "game_over"
+            return
 
         for wh in list(warehouses):
             if wh.is_destroyed(): wh.kill()
@@ -778,68 +1302,431 @@ while running:
         for jet_entity in list(fighter_jets):
             if jet_entity.is_destroyed(): jet_entity.kill()
 
-        if not warehouses and not aa_guns and not fighter_jets:
+        if not warehouses and not aa_guns and not fighter_jets and stage_spawn_index >= len(stage_plan.spawns):
             game_state = "stage_clear"
-            stage_clear_message_display_time = pygame.time.get_ticks()
-            stage_clear_font = pygame.font.Font(None, 74)
-            stage_clear_text = stage_clear_font.render("Stage Clear!", True, GREEN)
-            stage_clear_rect = stage_clear_text.get_rect(center=(SCREEN_WIDTH/2, SCREEN_HEIGHT/2))
+            stage_clear_message_display_time = get_game_ticks()
+            record_event(EVENT_STAGE_CLEAR, value=current_ticks - game_start_time)
+            if telemetry is not None: telemetry.flush()
             print(f"Stage Clear! Current Score: {score}")
             play_sound(sound_stage_clear)
+            return
 
-    # Drawing
-    screen.fill(BLACK)
+        if len(players) == 1: rewind_buffer.push(capture_snapshot()) # Snapshots cover single-player games only
+
+def record_session():
+    global session_recorded, session_key
+    if score_store is None or session_recorded: return
+    session_key = score_store.record_session(score, current_stage, get_game_ticks() - session_start_time, len(players), session_key)
+    session_recorded = True
+
+def draw_frame(surface, alpha):
+    # alpha is how far (0..1) real time has progressed into the next simulation step
+    surface.fill(BLACK)
     if game_state == "get_ready":
         stage_font_large = pygame.font.Font(None, 74)
         stage_text_large = stage_font_large.render(f"Stage: {current_stage}", True, WHITE)
         stage_rect_large = stage_text_large.get_rect(center=(SCREEN_WIDTH/2, SCREEN_HEIGHT/2 - 50))
-        screen.blit(stage_text_large, stage_rect_large)
+        render_queue.submit(LAYER_HUD, stage_text_large, stage_rect_large)
 
         get_ready_font = pygame.font.Font(None, 74)
         get_ready_text_surf = get_ready_font.render("Get Ready!", True, GREEN)
         get_ready_rect = get_ready_text_surf.get_rect(center=(SCREEN_WIDTH/2, SCREEN_HEIGHT/2 + 30))
-        screen.blit(get_ready_text_surf, get_ready_rect)
+        render_queue.submit(LAYER_HUD, get_ready_text_surf, get_ready_rect)
 
     elif game_state == "playing" or game_state == "stage_clear":
-        player.draw(screen); warehouses.draw(screen); aa_guns.draw(screen)
-        fighter_jets.draw(screen); enemy_bullets.draw(screen)
-        if battleship.is_active: battleship.draw(screen)
-
-        score_font = pygame.font.Font(None, 36)
-        score_text_surface = score_font.render(f"Score: {score}", True, WHITE)
-        screen.blit(score_text_surface, (SCREEN_WIDTH - score_text_surface.get_width() - 10, 10))
+        # Entities only submit draw commands; the layers decide what ends up on top
+        for each_player in players: each_player.draw(render_queue, alpha, show_health_bar=each_player is player)
+        for wh in warehouses: wh.draw(render_queue)
+        for gun in aa_guns: gun.draw(render_queue)
+        for jet in fighter_jets: jet.draw(render_queue, alpha)
+        for bullet in enemy_bullets: bullet.draw(render_queue, alpha)
+        if battleship.is_active: battleship.draw(render_queue, alpha)
 
-        stage_font = pygame.font.Font(None, 36)
-        stage_text_surface = stage_font.render(f"Stage: {current_stage}", True, WHITE)
-        screen.blit(stage_text_surface, (10, SCREEN_HEIGHT - stage_text_surface.get_height() - 10))
+        hud.draw(render_queue, score, current_stage)
 
         if battleship_approaching_message_active:
             warn_font = pygame.font.Font(None, 50)
             warn_text_surf = warn_font.render("Battleship Approaching!", True, RED)
             warn_rect = warn_text_surf.get_rect(center=(SCREEN_WIDTH/2, 30))
-            screen.blit(warn_text_surf, warn_rect)
+            render_queue.submit(LAYER_HUD, warn_text_surf, warn_rect)
 
         if game_state == "stage_clear":
-            screen.blit(stage_clear_text, stage_clear_rect) # Defined when state changes
-            if pygame.time.get_ticks() - stage_clear_message_display_time > STAGE_CLEAR_DURATION:
-                reset_stage(); # game_state becomes "get_ready"
+            render_queue.submit(LAYER_HUD, stage_clear_text, stage_clear_rect)
 
     elif game_state == "game_over":
         game_over_font = pygame.font.Font(None, 100)
         game_over_text_surf = game_over_font.render("Game Over", True, RED)
         game_over_rect = game_over_text_surf.get_rect(center=(SCREEN_WIDTH/2, SCREEN_HEIGHT/3))
-        screen.blit(game_over_text_surf, game_over_rect)
+        render_queue.submit(LAYER_HUD, game_over_text_surf, game_over_rect)
         final_score_font = pygame.font.Font(None, 50)
         final_score_text_surf = final_score_font.render(f"Final Score: {score}", True, WHITE)
         final_score_rect = final_score_text_surf.get_rect(center=(SCREEN_WIDTH/2, SCREEN_HEIGHT/2))
-        screen.blit(final_score_text_surf, final_score_rect)
+        render_queue.submit(LAYER_HUD, final_score_text_surf, final_score_rect)
         restart_font = pygame.font.Font(None, 40)
         restart_text_surf = restart_font.render("Press 'R' to Restart", True, WHITE)
         restart_rect = restart_text_surf.get_rect(center=(SCREEN_WIDTH/2, SCREEN_HEIGHT * 0.65))
-        screen.blit(restart_text_surf, restart_rect)
+        render_queue.submit(LAYER_HUD, restart_text_surf, restart_rect)
         quit_text_surf = restart_font.render("Press 'Q' to Quit", True, WHITE)
         quit_rect = quit_text_surf.get_rect(center=(SCREEN_WIDTH/2, SCREEN_HEIGHT * 0.75))
-        screen.blit(quit_text_surf, quit_rect)
+        render_queue.submit(LAYER_HUD, quit_text_surf, quit_rect)
+        if len(rewind_buffer):
+            rewind_text_surf = restart_font.render(f"Press 'Backspace' to Rewind {REWIND_SECONDS}s", True, WHITE)
+            rewind_rect = rewind_text_surf.get_rect(center=(SCREEN_WIDTH/2, SCREEN_HEIGHT * 0.85))
+            render_queue.submit(LAYER_HUD, rewind_text_surf, rewind_rect)
+        if score_store is not None and score_store.top_scores: # Cached at startup; no database access here
+            high_score_font = pygame.font.Font(None, 28)
+            render_queue.submit(LAYER_HUD, high_score_font.render("High Scores", True, GREEN), (SCREEN_WIDTH - 170, 20))
+            for rank, (high_score, stage_reached, _, _) in enumerate(score_store.top_scores[:5], start=1):
+                high_score_surf = high_score_font.render(f"{rank}. {high_score} (Stage {stage_reached})", True, WHITE)
+                render_queue.submit(LAYER_HUD, high_score_surf, (SCREEN_WIDTH - 170, 20 + rank * 24))
+    render_queue.flush(surface)
+
+# Co-op Networking
+SNAPSHOT_HISTORY_TICKS = 64 # How far back an acknowledged snapshot can still serve as a delta baseline
+MAX_BUFFERED_INPUTS = 4 # Inputs queued beyond this on the server are dropped to bound input latency
+ENTITY_RECORD = struct.Struct("<Bhhiih") # kind, x, y, health, max health, aux (player slot, projectile owner or jet angle)
+COOP_GAME_HEADER = struct.Struct("<iHB") # score, stage, game state
+(ENTITY_PLAYER, ENTITY_VULCAN, ENTITY_MISSILE, ENTITY_ENEMY_BULLET,
+ ENTITY_WAREHOUSE, ENTITY_AAGUN, ENTITY_FIGHTER_JET, ENTITY_BATTLESHIP) = range(8)
+net_ids = itertools.count(1)
+
+def net_id(sprite):
+    if not hasattr(sprite, 'net_id'): sprite.net_id = next(net_ids)
+    return sprite.net_id
+
+def coop_entity_table():
+    entities = {}
+    for slot, each_player in enumerate(players):
+        entities[net_id(each_player)] = ENTITY_RECORD.pack(ENTITY_PLAYER, each_player.rect.x, each_player.rect.y, each_player.health, each_player.max_health, slot)
+        for proj in each_player.vulcan_bullets: entities[net_id(proj)] = ENTITY_RECORD.pack(ENTITY_VULCAN, proj.rect.x, proj.rect.y, 0, 0, slot)
+        for proj in each_player.missiles: entities[net_id(proj)] = ENTITY_RECORD.pack(ENTITY_MISSILE, proj.rect.x, proj.rect.y, 0, 0, slot)
+    for bullet in enemy_bullets: entities[net_id(bullet)] = ENTITY_RECORD.pack(ENTITY_ENEMY_BULLET, bullet.rect.x, bullet.rect.y, 0, 0, 0)
+    for wh in warehouses: entities[net_id(wh)] = ENTITY_RECORD.pack(ENTITY_WAREHOUSE, wh.rect.x, wh.rect.y, wh.health, wh.max_health, 0)
+    for gun in aa_guns: entities[net_id(gun)] = ENTITY_RECORD.pack(ENTITY_AAGUN, gun.rect.x, gun.rect.y, gun.health, gun.max_health, 0)
+    for jet in fighter_jets:
+        entities[net_id(jet)] = ENTITY_RECORD.pack(ENTITY_FIGHTER_JET, jet.rect.x, jet.rect.y, jet.health, jet.max_health, round(jet.image_angle_deg))
+    if battleship.is_active:
+        entities[net_id(battleship)] = ENTITY_RECORD.pack(ENTITY_BATTLESHIP, battleship.rect.x, battleship.rect.y, battleship.health, battleship.max_health, 0)
+    return entities
+
+class CoopServer:
+    # Runs the authoritative simulation. Remote players send an input bitmask per tick; after each
+    # update_simulation step every client gets the entities that changed since the snapshot it last
+    # acknowledged (or everything, if that snapshot is too old).
+    def __init__(self, transport):
+        self.transport = transport
+        self.clients = {} # address -> {'slot', 'player', 'inputs', 'input_ack', 'acked_tick'}
+        self.tick = 0
+        self.history = {} # tick -> entity table
+        self.tick_time_ms = 0.0
+        self.bytes_last_tick = 0
+
+    def poll(self):
+        for data, address in self.transport.receive():
+            if not data: continue
+            if data[0] == PACKET_JOIN:
+                self.add_client(address)
+            elif data[0] == PACKET_INPUT and address in self.clients and len(data) == INPUT_PACKET.size:
+                _, input_seq, acked_tick, bits = INPUT_PACKET.unpack(data)
+                client = self.clients[address]
+                client['acked_tick'] = max(client['acked_tick'], acked_tick)
+                if input_seq > client['input_ack'] and (not client['inputs'] or input_seq > client['inputs'][-1][0]):
+                    client['inputs'].append((input_seq, bits))
+                    while len(client['inputs']) > MAX_BUFFERED_INPUTS: client['inputs'].popleft()
+
+    def add_client(self, address):
+        if address not in self.clients:
+            if len(players) >= MAX_PLAYERS:
+                self.transport.send(WELCOME_PACKET.pack(PACKET_WELCOME, SERVER_FULL), address)
+                return
+            slot = len(players)
+            remote_player = Player(*player_spawn_position(slot))
+            players.append(remote_player); all_sprites.add(remote_player)
+            self.clients[address] = {'slot': slot, 'player': remote_player, 'inputs': deque(), 'input_ack': 0, 'acked_tick': 0}
+            print(f"Co-op: player {slot + 1} joined from {address}")
+        self.transport.send(WELCOME_PACKET.pack(PACKET_WELCOME, self.clients[address]['slot']), address)
+
+    def close(self):
+        for client in self.clients.values():
+            client['player'].kill()
+            players.remove(client['player'])
+        self.clients.clear()
+        self.transport.close()
+
+    def step(self, keys=None):
+        started = time.perf_counter()
+        self.poll()
+        for client in self.clients.values():
+            if client['inputs']: # Otherwise the last input is repeated until the next one arrives
+                client['input_ack'], client['player'].input_bits = client['inputs'].popleft()
+        update_simulation(keys)
+
+        self.tick += 1
+        entities = coop_entity_table()
+        self.history[self.tick] = entities
+        self.history.pop(self.tick - SNAPSHOT_HISTORY_TICKS, None)
+        game_header = COOP_GAME_HEADER.pack(score, current_stage, GAME_STATES.index(game_state))
+        bytes_before = self.transport.bytes_sent
+        for address, client in self.clients.items():
+            baseline_tick = client['acked_tick'] if client['acked_tick'] in self.history else 0
+            changed, removed = diff_entities(entities, self.history.get(baseline_tick, {}))
+            self.transport.send(pack_snapshot(self.tick, baseline_tick, client['input_ack'], game_header, changed, removed), address)
+        self.bytes_last_tick = self.transport.bytes_sent - bytes_before
+        self.tick_time_ms = (time.perf_counter() - started) * 1000
+
+class CoopClient:
+    # Sends this machine's input bitmask every tick and mirrors the server's entities into the local
+    # sprite groups (unless mirror is False, for headless clients). The local helicopter is predicted:
+    # the server's position is replayed forward through the inputs the server has not applied yet.
+    def __init__(self, transport, server_address, mirror=True):
+        self.transport = transport
+        self.server_address = server_address
+        self.mirror = mirror
+        self.slot = None
+        self.tick = 0 # Newest snapshot applied
+        self.snapshots = {0: {}} # tick -> entity table, kept as delta baselines
+        self.entities = {}
+        self.own_id = None
+        self.score = 0; self.stage = 1; self.game_state = "get_ready"
+        self.input_seq = 0
+        self.pending_inputs = deque() # (sequence, bits) not yet applied by the server
+        self.predicted_rect = None
+        self.changed_ids = set()
+        self.sprites = {} # entity id -> mirrored sprite
+        self.players_by_slot = {}
+        if mirror: # Everything but the local helicopter now comes from the server
+            for sprite in all_sprites: sprite.kill()
+            warehouses.empty(); aa_guns.empty(); fighter_jets.empty(); enemy_bullets.empty()
+            player.vulcan_bullets.empty(); player.missiles.empty()
+            all_sprites.add(player)
+        self.transport.send(JOIN_PACKET.pack(PACKET_JOIN), server_address)
+
+    def poll(self):
+        for data, _ in self.transport.receive():
+            if not data: continue
+            if data[0] == PACKET_WELCOME and len(data) == WELCOME_PACKET.size:
+                _, slot = WELCOME_PACKET.unpack(data)
+                if slot == SERVER_FULL: print("Co-op: server is full")
+                elif self.slot is None:
+                    self.slot = slot
+                    print(f"Co-op: joined as player {slot + 1}")
+            elif data[0] == PACKET_SNAPSHOT:
+                tick, baseline_tick, input_ack, game_header, changed, removed = unpack_snapshot(data, COOP_GAME_HEADER.size, ENTITY_RECORD.size)
+                if tick <= self.tick or baseline_tick not in self.snapshots: continue # Stale, or its baseline was dropped
+                self.entities = apply_entity_delta(self.snapshots[baseline_tick], changed, removed)
+                self.snapshots[tick] = self.entities
+                for old_tick in [t for t in self.snapshots if 0 < t <= tick - SNAPSHOT_HISTORY_TICKS]: del self.snapshots[old_tick]
+                self.tick = tick
+                self.score, self.stage, state_index = COOP_GAME_HEADER.unpack(game_header)
+                self.game_state = GAME_STATES[state_index]
+                self.changed_ids.update(entity_id for entity_id, _ in changed)
+                self.changed_ids.update(removed)
+                while self.pending_inputs and self.pending_inputs[0][0] <= input_ack: self.pending_inputs.popleft()
+
+    def step(self, keys=None, bits=None):
+        global running
+        self.poll()
+        if keys is not None and keys[pygame.K_ESCAPE]: running = False
+        if self.slot is None:
+            if self.input_seq % FPS == 0: self.transport.send(JOIN_PACKET.pack(PACKET_JOIN), self.server_address) # Retry once a second
+            self.input_seq += 1
+            return
+        if bits is None: bits = input_bits_from_keys(keys) if keys is not None else 0
+        self.input_seq += 1
+        self.pending_inputs.append((self.input_seq, bits))
+        while len(self.pending_inputs) > FPS * 2: self.pending_inputs.popleft() # Server unreachable; don't grow forever
+        self.transport.send(INPUT_PACKET.pack(PACKET_INPUT, self.input_seq, self.tick, bits), self.server_address)
+        self.predict()
+        if self.mirror: self.mirror_into_game()
+
+    def predict(self):
+        if self.own_id not in self.entities:
+            self.own_id = next((entity_id for entity_id, record in self.entities.items()
+                                if record[0] == ENTITY_PLAYER and ENTITY_RECORD.unpack(record)[5] == self.slot), None)
+            if self.own_id is None: return
+        _, x, y, health, _, _ = ENTITY_RECORD.unpack(self.entities[self.own_id])
+        rect = pygame.Rect((x, y), player.rect.size)
+        if health > 0 and self.game_state == "playing":
+            for _, bits in self.pending_inputs:
+                velocity_x, velocity_y = movement_velocity(bits, player.speed)
+                rect.x += velocity_x; rect.y += velocity_y
+                clamp_to_screen(rect)
+        self.predicted_rect = rect
+
+    def mirror_into_game(self):
+        global score, current_stage, game_state
+        score = self.score; current_stage = self.stage; game_state = self.game_state
+        changed = [(entity_id, self.entities[entity_id]) for entity_id in self.changed_ids if entity_id in self.entities]
+        changed.sort(key=lambda item: item[1][0]) # Players first, so projectiles can find their owner
+        for entity_id in self.changed_ids:
+            if entity_id not in self.entities and entity_id in self.sprites: self.remove_mirror_sprite(self.sprites.pop(entity_id))
+        self.changed_ids.clear()
+        for entity_id, record in changed:
+            kind, x, y, health, max_health, aux = ENTITY_RECORD.unpack(record)
+            sprite = self.sprites.get(entity_id)
+            if sprite is None: sprite = self.sprites[entity_id] = self.create_mirror_sprite(kind, x, y, aux)
+            if kind == ENTITY_FIGHTER_JET and aux != sprite.image_angle_deg:
+                sprite.image_angle_deg = aux
+                sprite.image = pygame.transform.rotate(sprite.original_image, aux)
+                sprite.rect = sprite.image.get_rect()
+            sprite.rect.topleft = (x, y)
+            if kind in (ENTITY_PLAYER, ENTITY_WAREHOUSE, ENTITY_AAGUN, ENTITY_FIGHTER_JET, ENTITY_BATTLESHIP):
+                sprite.max_health = max_health
+                sprite.health = health
+        if self.predicted_rect is not None: player.rect.topleft = self.predicted_rect.topleft
+
+    def create_mirror_sprite(self, kind, x, y, aux):
+        owner = self.players_by_slot.get(aux, player)
+        if kind == ENTITY_PLAYER:
+            if aux == self.slot: sprite = player
+            else: sprite = Player(); players.append(sprite)
+            self.players_by_slot[aux] = sprite; all_sprites.add(sprite)
+        elif kind == ENTITY_VULCAN: sprite = Bullet(x, y, 0, 0); owner.vulcan_bullets.add(sprite)
+        elif kind == ENTITY_MISSILE: sprite = Missile(x, y, 0, 0); owner.missiles.add(sprite)
+        elif kind == ENTITY_ENEMY_BULLET: sprite = EnemyBullet(x, y); enemy_bullets.add(sprite)
+        elif kind == ENTITY_WAREHOUSE: sprite = Warehouse(x, y); warehouses.add(sprite); all_sprites.add(sprite)
+        elif kind == ENTITY_AAGUN: sprite = AAGun(x, y); aa_guns.add(sprite); all_sprites.add(sprite)
+        elif kind == ENTITY_FIGHTER_JET: sprite = FighterJet(x, y, player.speed, None); fighter_jets.add(sprite); all_sprites.add(sprite)
+        else:
+            sprite = battleship; battleship.is_active = True
+            battleship_group.add(battleship); all_sprites.add(battleship)
+        return sprite
+
+    def remove_mirror_sprite(self, sprite):
+        if sprite is battleship: battleship.is_active = False
+        if sprite is player: return
+        sprite.kill()
+        if sprite in players: players.remove(sprite)
+
+def run_coop_benchmark(ticks=480):
+    # Runs the server with 1-4 players over the in-process loopback transport, everyone firing, and
+    # reports bandwidth and server tick cost as the player and projectile counts grow
+    global game_state
+    print("players  entities  projectiles  bytes/tick  bytes/client/tick  tick ms (avg)  tick ms (max)")
+    for player_count in range(1, MAX_PLAYERS + 1):
+        network = LoopbackNetwork()
+        server = CoopServer(network.endpoint("server"))
+        clients = [CoopClient(network.endpoint(f"client{slot}"), "server", mirror=False) for slot in range(1, player_count)]
+        for client in clients: client.step() # Join
+        server.step()
+        reset_stage(is_first_load=True)
+        game_state = "playing"
+        entity_total = projectile_total = bytes_total = 0
+        tick_times = []
+        for tick in range(ticks):
+            heading = INPUT_RIGHT if (tick // 60) % 2 == 0 else INPUT_LEFT # Keep everyone moving back and forth
+            player.input_bits = heading | INPUT_VULCAN
+            for slot, client in enumerate(clients, start=1):
+                client.step(bits=heading | INPUT_VULCAN | (INPUT_MISSILE if slot % 2 else INPUT_UP))
+            server.step()
+            entity_total += len(server.history[server.tick])
+            projectile_total += len(enemy_bullets) + sum(len(p.vulcan_bullets) + len(p.missiles) for p in players)
+            bytes_total += server.bytes_last_tick
+            tick_times.append(server.tick_time_ms)
+        remote_clients = max(1, player_count - 1)
+        print(f"{player_count:7d}  {entity_total / ticks:8.1f}  {projectile_total / ticks:11.1f}  {bytes_total / ticks:10.1f}"
+              f"  {bytes_total / ticks / remote_clients:17.1f}  {sum(tick_times) / ticks:13.3f}  {max(tick_times):13.3f}")
+        for client in clients: client.transport.close()
+        server.close()
+    reset_stage(is_first_load=True)
+
+# Soak Test
+SOAK_WARMUP_FRACTION = 0.25 # Caches and the rewind buffer fill up during the first part of the run
+SOAK_MEMORY_TOLERANCE = 256 * 1024 # Allowed growth in traced bytes between the end of warm-up and the last transition
+
+def autopilot_input(pilot):
+    # Lines up with the nearest target, then flies at it firing both weapons
+    targets = [*warehouses, *aa_guns, *fighter_jets]
+    bits = INPUT_VULCAN | INPUT_MISSILE
+    if not targets: return bits
+    target = min(targets, key=lambda t: (t.rect.centerx - pilot.rect.centerx)**2 + (t.rect.centery - pilot.rect.centery)**2)
+    dx = target.rect.centerx - pilot.rect.centerx; dy = target.rect.centery - pilot.rect.centery
+    if abs(dy) > pilot.speed: bits |= INPUT_DOWN if dy > 0 else INPUT_UP
+    elif abs(dx) > pilot.speed: bits |= INPUT_RIGHT if dx > 0 else INPUT_LEFT
+    return bits
+
+def run_soak_test(seconds):
+    # Runs the simulation flat out without a display, restarting after every game over, and
+    # renders once per game second so the draw path is covered too. Returns False on a leak.
+    reset_stage(is_first_load=True)
+    steps = int(seconds * 1000 / FIXED_TIMESTEP_MS)
+    started = time.perf_counter()
+    for step in range(steps):
+        if game_state == "game_over": reset_stage(is_first_load=True)
+        elif game_state == "playing": player.input_bits = autopilot_input(player)
+        remember_positions()
+        update_simulation()
+        if step % FPS == 0: draw_frame(screen, 0.0)
+    print(f"Soak: {seconds:.0f}s of game time in {time.perf_counter() - started:.0f}s, {auditor.transitions} stage transitions")
+
+    warmup = max(1, int(len(auditor.memory) * SOAK_WARMUP_FRACTION))
+    if len(auditor.memory) - warmup < 2:
+        print("Soak FAILED: too few stage transitions to judge memory; run for longer")
+        return False
+    growth = auditor.memory[-1] - auditor.memory[warmup]
+    print(f"Soak: traced memory {auditor.memory[warmup] / 1024:.0f} KB after warm-up, {auditor.memory[-1] / 1024:.0f} KB at the end ({growth / 1024:+.0f} KB)")
+    if auditor.growing: print(f"Soak: flagged as growing at some point: {', '.join(sorted(auditor.growing))}")
+    passed = auditor.survivor_total == 0 and growth <= SOAK_MEMORY_TOLERANCE
+    print(f"Soak {'passed' if passed else 'FAILED'}: {auditor.survivor_total} entities survived kill(), report in {auditor.path}")
+    return passed
 
-    pygame.display.flip()
-pygame.quit()
+# Main Game Loop
+coop_server = None
+coop_client = None
+running = True
+if __name__ == "__main__":
+    if args.host is not None:
+        coop_server = CoopServer(UdpTransport(("0.0.0.0", args.host)))
+        print(f"Co-op: hosting on port {args.host}")
+    elif args.join:
+        join_host, _, join_port = args.join.partition(":")
+        coop_client = CoopClient(UdpTransport(("0.0.0.0", 0)), (join_host, int(join_port) if join_port else COOP_PORT))
+
+    if args.telemetry:
+        telemetry = TelemetryRecorder(args.telemetry)
+    if args.audit:
+        auditor = LifecycleAuditor(args.audit, (Bullet, Missile, EnemyBullet, Warehouse, AAGun, FighterJet, Battleship, Player),
+                                   (pygame.sprite.AbstractGroup,))
+    if coop_client is None and not args.coop_bench and args.soak is None:
+        score_store = ScoreStore(args.scores_db)
+
+    soak_passed = True
+    if args.coop_bench:
+        run_coop_benchmark()
+        running = False
+    elif args.soak is not None:
+        soak_passed = run_soak_test(args.soak)
+        running = False
+    frame_time_accumulator = 0.0
+    next_stage_check_time = 0
+    while running:
+        frame_ms = clock.tick(RENDER_FPS_CAP)
+        if coop_client is None and pygame.time.get_ticks() >= next_stage_check_time: # Clients only mirror the host's stage
+            next_stage_check_time = pygame.time.get_ticks() + STAGE_RELOAD_CHECK_MS
+            if stage_table.files_changed(): reload_stage_data()
+        quality.record_frame(clock.get_rawtime()) # Time spent working last frame, excluding the tick delay
+        handle_events()
+        keys = pygame.key.get_pressed()
+
+        # Fixed-timestep updates: catch up on elapsed time, but never more than MAX_CATCHUP_STEPS per frame
+        frame_time_accumulator += min(frame_ms, MAX_FRAME_TIME_MS)
+        steps_this_frame = 0
+        while frame_time_accumulator >= FIXED_TIMESTEP_MS and steps_this_frame < MAX_CATCHUP_STEPS and running:
+            remember_positions()
+            if coop_client is not None: coop_client.step(keys)
+            elif coop_server is not None: coop_server.step(keys)
+            else: update_simulation(keys)
+            frame_time_accumulator -= FIXED_TIMESTEP_MS
+            steps_this_frame += 1
+        if frame_time_accumulator >= FIXED_TIMESTEP_MS:
+            frame_time_accumulator %= FIXED_TIMESTEP_MS # Drop the backlog rather than spiral further behind
+
+        draw_frame(screen, frame_time_accumulator / FIXED_TIMESTEP_MS)
+        pygame.display.flip()
+    if telemetry is not None: telemetry.close()
+    if auditor is not None: auditor.close()
+    if score_store is not None:
+        if score > 0 or current_stage > 1: record_session() # Keep a game quit mid-way in the history too
+        score_store.close()
+    pygame.quit()
+    if not soak_passed: raise SystemExit(1)
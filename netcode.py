@@ -0,0 +1,113 @@
+import socket
+import struct
+import zlib
+from collections import deque
+
+# Local co-op networking helpers: datagram transports and the packet formats exchanged between
+# the authoritative server and its clients. Nothing here knows about sprites; the game packs each
+# entity into a fixed-size record and these helpers only diff and ship the records.
+
+# Packet types (first byte of every datagram)
+PACKET_JOIN = 1
+PACKET_WELCOME = 2
+PACKET_INPUT = 3
+PACKET_SNAPSHOT = 4
+
+JOIN_PACKET = struct.Struct("<B")
+WELCOME_PACKET = struct.Struct("<BB") # type, player slot (255 = server full)
+INPUT_PACKET = struct.Struct("<BIIB") # type, input sequence, newest snapshot tick received, input bitmask
+SNAPSHOT_HEADER = struct.Struct("<BIIIHH") # type, tick, baseline tick, last input sequence applied, changed, removed
+ENTITY_ID = struct.Struct("<I")
+SERVER_FULL = 255
+
+# Transports
+class LoopbackNetwork:
+    # In-process stand-in for a UDP network: datagrams are delivered through per-address queues
+    def __init__(self):
+        self.queues = {}
+
+    def endpoint(self, address):
+        self.queues[address] = deque()
+        return LoopbackTransport(self, address)
+
+class LoopbackTransport:
+    def __init__(self, network, address):
+        self.network = network
+        self.address = address
+        self.bytes_sent = 0
+
+    def send(self, data, address):
+        self.bytes_sent += len(data)
+        queue = self.network.queues.get(address)
+        if queue is not None: queue.append((bytes(data), self.address))
+
+    def receive(self):
+        queue = self.network.queues.get(self.address)
+        if not queue: return []
+        packets = list(queue)
+        queue.clear()
+        return packets
+
+    def close(self):
+        self.network.queues.pop(self.address, None)
+
+class UdpTransport:
+    def __init__(self, address=("127.0.0.1", 0)):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(address)
+        self.sock.setblocking(False)
+        self.address = self.sock.getsockname()
+        self.bytes_sent = 0
+
+    def send(self, data, address):
+        self.bytes_sent += len(data)
+        try:
+            self.sock.sendto(data, address)
+        except OSError: # Treated like any other lost datagram
+            pass
+
+    def receive(self):
+        packets = []
+        while True:
+            try:
+                packets.append(self.sock.recvfrom(65535))
+            except (BlockingIOError, ConnectionResetError):
+                return packets
+
+    def close(self):
+        self.sock.close()
+
+# Entity Delta Encoding
+def diff_entities(entities, baseline):
+    # entities and baseline map entity id -> packed record bytes
+    changed = [(entity_id, record) for entity_id, record in entities.items() if baseline.get(entity_id) != record]
+    removed = [entity_id for entity_id in baseline if entity_id not in entities]
+    return changed, removed
+
+def apply_entity_delta(baseline, changed, removed):
+    entities = dict(baseline)
+    entities.update(changed)
+    for entity_id in removed: entities.pop(entity_id, None)
+    return entities
+
+def pack_snapshot(tick, baseline_tick, input_ack, game_header, changed, removed):
+    # game_header is a fixed-size record of game-wide values (score, stage, ...) chosen by the caller
+    body = [game_header]
+    for entity_id, record in changed: body.append(ENTITY_ID.pack(entity_id)); body.append(record)
+    for entity_id in removed: body.append(ENTITY_ID.pack(entity_id))
+    header = SNAPSHOT_HEADER.pack(PACKET_SNAPSHOT, tick, baseline_tick, input_ack, len(changed), len(removed))
+    return header + zlib.compress(b"".join(body), 1)
+
+def unpack_snapshot(data, game_header_size, record_size):
+    _, tick, baseline_tick, input_ack, changed_count, removed_count = SNAPSHOT_HEADER.unpack_from(data, 0)
+    body = zlib.decompress(data[SNAPSHOT_HEADER.size:])
+    game_header = body[:game_header_size]
+    offset = game_header_size
+    changed = []
+    for _ in range(changed_count):
+        entity_id, = ENTITY_ID.unpack_from(body, offset)
+        offset += ENTITY_ID.size
+        changed.append((entity_id, body[offset:offset + record_size]))
+        offset += record_size
+    removed = [entity_id for entity_id, in ENTITY_ID.iter_unpack(body[offset:offset + removed_count * ENTITY_ID.size])]
+    return tick, baseline_tick, input_ack, game_header, changed, removed
@@ -0,0 +1,116 @@
+import sys
+import queue
+import sqlite3
+import datetime
+import itertools
+import threading
+
+# Persistent high scores and session history in a local SQLite database (WAL mode). Sessions are
+# written by a background thread in batches, and the top scores are read once at startup and then
+# kept up to date in memory, so neither recording a session nor showing the leaderboard touches
+# the database from the game loop.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    ended_at TEXT NOT NULL,
+    day TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    stage_reached INTEGER NOT NULL,
+    duration_ms INTEGER NOT NULL,
+    players INTEGER NOT NULL DEFAULT 1
+);
+DROP INDEX IF EXISTS sessions_by_score;
+DROP INDEX IF EXISTS sessions_by_stage;
+DROP INDEX IF EXISTS sessions_by_day;
+CREATE INDEX IF NOT EXISTS sessions_top_scores ON sessions (score DESC, stage_reached, day);
+CREATE INDEX IF NOT EXISTS sessions_top_scores_by_stage ON sessions (stage_reached, score DESC, day);
+CREATE INDEX IF NOT EXISTS sessions_top_scores_by_day ON sessions (day, score DESC, stage_reached);
+"""
+INSERT_SESSION = "INSERT INTO sessions (ended_at, day, score, stage_reached, duration_ms, players) VALUES (?, ?, ?, ?, ?, ?)"
+UPDATE_SESSION = "UPDATE sessions SET ended_at = ?, day = ?, score = ?, stage_reached = ?, duration_ms = ?, players = ? WHERE id = ?"
+TOP_SCORES_CACHED = 10
+
+def connect(path):
+    connection = sqlite3.connect(path)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL") # Safe with WAL; a crash can only lose the last batch
+    connection.executescript(SCHEMA)
+    return connection
+
+# Queries (each answered from one of the indexes above without reading the table)
+def top_scores(connection, limit=TOP_SCORES_CACHED):
+    return connection.execute("SELECT score, stage_reached, day FROM sessions ORDER BY score DESC LIMIT ?", (limit,)).fetchall()
+
+def top_scores_for_stage(connection, stage_reached, limit=TOP_SCORES_CACHED):
+    return connection.execute("SELECT score, stage_reached, day FROM sessions WHERE stage_reached = ? ORDER BY score DESC LIMIT ?",
+                              (stage_reached, limit)).fetchall()
+
+def top_scores_for_day(connection, day, limit=TOP_SCORES_CACHED):
+    return connection.execute("SELECT score, stage_reached, day FROM sessions WHERE day = ? ORDER BY score DESC LIMIT ?",
+                              (day, limit)).fetchall()
+
+def best_score_per_stage(connection):
+    return connection.execute("SELECT stage_reached, MAX(score), COUNT(*) FROM sessions GROUP BY stage_reached ORDER BY stage_reached").fetchall()
+
+class ScoreStore:
+    def __init__(self, path):
+        self.path = path
+        connection = connect(path)
+        # (score, stage reached, day, session key), best first; only sessions recorded since startup have a key
+        self.top_scores = [(score, stage_reached, day, None) for score, stage_reached, day in top_scores(connection)]
+        connection.close()
+        self.session_keys = itertools.count(1)
+        self.pending = queue.SimpleQueue()
+        self.writer = threading.Thread(target=self.write_sessions, name="score-writer", daemon=True)
+        self.writer.start()
+
+    def record_session(self, score, stage_reached, duration_ms, players=1, session_key=None):
+        # Returns the session's key. Recording the same key again (a run that was rewound and ended
+        # again) replaces that session instead of adding another.
+        if session_key is None: session_key = next(self.session_keys)
+        now = datetime.datetime.now()
+        day = now.date().isoformat()
+        self.pending.put((session_key, (now.isoformat(timespec="seconds"), day, score, stage_reached, int(duration_ms), players)))
+        self.top_scores = [entry for entry in self.top_scores if entry[3] != session_key]
+        self.top_scores.append((score, stage_reached, day, session_key))
+        self.top_scores.sort(key=lambda entry: entry[0], reverse=True)
+        del self.top_scores[TOP_SCORES_CACHED:]
+        return session_key
+
+    def close(self):
+        self.pending.put(None)
+        self.writer.join()
+
+    def write_sessions(self):
+        connection = connect(self.path)
+        row_ids = {} # Session key -> row id, so a re-recorded session updates its row
+        closing = False
+        while not closing:
+            batch = [self.pending.get()] # Block for the first, then take whatever else is queued
+            while True:
+                try:
+                    batch.append(self.pending.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                closing = True
+                batch = [session for session in batch if session is not None]
+            if batch:
+                with connection:
+                    for session_key, session in batch:
+                        if session_key in row_ids: connection.execute(UPDATE_SESSION, session + (row_ids[session_key],))
+                        else: row_ids[session_key] = connection.execute(INSERT_SESSION, session).lastrowid
+        connection.close()
+
+if __name__ == "__main__":
+    connection = connect(sys.argv[1] if len(sys.argv) > 1 else "highscores.db")
+    print("Top scores:")
+    for rank, (score, stage_reached, day) in enumerate(top_scores(connection), start=1):
+        print(f"{rank:3d}. {score:8d}  stage {stage_reached:<3d} {day}")
+    today = datetime.date.today().isoformat()
+    print(f"Today ({today}): " + ", ".join(str(score) for score, _, _ in top_scores_for_day(connection, today)))
+    print("Best by stage reached:")
+    for stage_reached, best, sessions in best_score_per_stage(connection):
+        print(f"  stage {stage_reached:<3d} best {best:8d}  ({sessions} sessions)")
+    connection.close()
@@ -0,0 +1,166 @@
+import os
+import sys
+import json
+
+# Stage and wave definitions. Stage layouts and difficulty curves live in JSON files under
+# assets/stages; they are validated and compiled once at load time into one StagePlan per stage,
+# so starting a stage is a list lookup and the game only ever walks the spawn timeline it needs.
+#
+# difficulty.json: {"stages": N, "curves": {kind: {stat: {"base": b, "per_stage": p, "min": lo, "max": hi}}}}
+#   Stage n gets base + (n - 1) * per_stage, clamped to [min, max] when given. Plans are compiled
+#   for stages 1..N; later stages reuse stage N's plan.
+# stage-<n>.json: {"battleship_at_ms": ms or null, "waves": [{"at_ms": ms, "spawns": [{"kind": k, "x": x, "y": y}]}]}
+#   Times are from the moment play starts. A stage without its own file reuses the layout of the
+#   nearest lower-numbered stage file, with its own difficulty.
+
+KINDS = ("warehouse", "aa_gun", "fighter_jet")
+CURVES = {"warehouse": ("health",), "aa_gun": ("health", "fire_rate_ms"), "fighter_jet": ("health",), "battleship": ("health",)}
+CURVE_KEYS = ("base", "per_stage", "min", "max")
+DIFFICULTY_FILE = "difficulty.json"
+STAGE_FILE_PREFIX = "stage-"
+STAGE_FILE_SUFFIX = ".json"
+
+class StageDataError(ValueError):
+    pass
+
+class StagePlan:
+    def __init__(self, number, stats, spawns, battleship_at_ms):
+        self.number = number
+        self.warehouse_health = stats["warehouse", "health"]
+        self.aagun_health = stats["aa_gun", "health"]
+        self.aagun_fire_rate_ms = stats["aa_gun", "fire_rate_ms"]
+        self.fighter_health = stats["fighter_jet", "health"]
+        self.battleship_health = stats["battleship", "health"]
+        self.spawns = spawns # (at_ms, kind, x, y), sorted by time; shared between stages with the same layout
+        self.battleship_at_ms = battleship_at_ms # None when the stage has no battleship
+
+class StageTable:
+    def __init__(self, directory, plans, file_times):
+        self.directory = directory
+        self.plans = plans
+        self.file_times = file_times # Path -> mtime when loaded, for hot reload
+
+    def plan(self, stage):
+        return self.plans[min(max(stage, 1), len(self.plans)) - 1]
+
+    def files_changed(self):
+        # True once per edit: the new times are remembered, so a file that fails to load is
+        # reported once and retried only when it is saved again
+        try:
+            file_times = stage_file_times(self.directory)
+        except OSError:
+            file_times = None
+        changed = file_times != self.file_times
+        self.file_times = file_times
+        return changed
+
+def stage_file_times(directory):
+    return {os.path.join(directory, name): os.stat(os.path.join(directory, name)).st_mtime_ns
+            for name in os.listdir(directory) if name.endswith(STAGE_FILE_SUFFIX)}
+
+# Validation
+def require(condition, path, message):
+    if not condition: raise StageDataError(f"{path}: {message}")
+
+def require_int(value, path, minimum=None):
+    require(isinstance(value, int) and not isinstance(value, bool), path, f"expected an integer, got {value!r}")
+    if minimum is not None: require(value >= minimum, path, f"must be at least {minimum}, got {value}")
+    return value
+
+def require_keys(mapping, path, allowed, required=()):
+    require(isinstance(mapping, dict), path, "expected an object")
+    unknown = set(mapping) - set(allowed)
+    require(not unknown, path, f"unknown keys {sorted(unknown)}")
+    missing = set(required) - set(mapping)
+    require(not missing, path, f"missing keys {sorted(missing)}")
+
+def read_json(path):
+    try:
+        with open(path, encoding="utf-8") as f: return json.load(f)
+    except OSError as e:
+        raise StageDataError(f"{path}: {e.strerror}")
+    except json.JSONDecodeError as e:
+        raise StageDataError(f"{path}: line {e.lineno}: {e.msg}")
+
+def compile_difficulty(path, data):
+    # Returns one {(kind, stat): value} dict per stage
+    require_keys(data, path, ("stages", "curves"), ("stages", "curves"))
+    stage_count = require_int(data["stages"], f"{path}: stages", minimum=1)
+    require_keys(data["curves"], f"{path}: curves", CURVES, CURVES)
+    curves = []
+    for kind, stats in CURVES.items():
+        require_keys(data["curves"][kind], f"{path}: curves.{kind}", stats, stats)
+        for stat in stats:
+            where = f"{path}: curves.{kind}.{stat}"
+            curve = data["curves"][kind][stat]
+            require_keys(curve, where, CURVE_KEYS, ("base", "per_stage"))
+            for key in curve: require_int(curve[key], f"{where}.{key}")
+            curves.append(((kind, stat), curve, where))
+    table = []
+    for stage in range(1, stage_count + 1):
+        stats = {}
+        for key, curve, where in curves:
+            value = curve["base"] + (stage - 1) * curve["per_stage"]
+            if "min" in curve: value = max(curve["min"], value)
+            if "max" in curve: value = min(curve["max"], value)
+            require(value > 0, where, f"reaches {value} at stage {stage}; add a min")
+            stats[key] = value
+        table.append(stats)
+    return table
+
+def compile_layout(path, data, screen_size):
+    require_keys(data, path, ("battleship_at_ms", "waves"), ("waves",))
+    battleship_at_ms = data.get("battleship_at_ms")
+    if battleship_at_ms is not None: require_int(battleship_at_ms, f"{path}: battleship_at_ms", minimum=0)
+    require(isinstance(data["waves"], list) and data["waves"], f"{path}: waves", "expected a non-empty list")
+    spawns = []
+    for wave_index, wave in enumerate(data["waves"]):
+        where = f"{path}: waves[{wave_index}]"
+        require_keys(wave, where, ("at_ms", "spawns"), ("at_ms", "spawns"))
+        at_ms = require_int(wave["at_ms"], f"{where}.at_ms", minimum=0)
+        require(isinstance(wave["spawns"], list) and wave["spawns"], f"{where}.spawns", "expected a non-empty list")
+        for spawn_index, spawn in enumerate(wave["spawns"]):
+            spawn_where = f"{where}.spawns[{spawn_index}]"
+            require_keys(spawn, spawn_where, ("kind", "x", "y"), ("kind", "x", "y"))
+            require(spawn["kind"] in KINDS, f"{spawn_where}.kind", f"expected one of {', '.join(KINDS)}, got {spawn['kind']!r}")
+            x = require_int(spawn["x"], f"{spawn_where}.x", minimum=0)
+            y = require_int(spawn["y"], f"{spawn_where}.y", minimum=0)
+            require(x < screen_size[0] and y < screen_size[1], spawn_where, f"({x}, {y}) is off screen")
+            spawns.append((at_ms, spawn["kind"], x, y))
+    spawns.sort(key=lambda spawn: spawn[0]) # Stable, so spawns at the same time keep file order
+    return tuple(spawns), battleship_at_ms
+
+def load_stage_table(directory, screen_size):
+    # Raises StageDataError naming the file and field when anything is missing or malformed
+    try:
+        file_times = stage_file_times(directory)
+    except OSError as e:
+        raise StageDataError(f"{directory}: {e.strerror}")
+    difficulty_path = os.path.join(directory, DIFFICULTY_FILE)
+    difficulty = compile_difficulty(difficulty_path, read_json(difficulty_path))
+    layouts = {}
+    for path in file_times:
+        name = os.path.basename(path)
+        if not name.startswith(STAGE_FILE_PREFIX): continue
+        number = name[len(STAGE_FILE_PREFIX):-len(STAGE_FILE_SUFFIX)]
+        require(number.isdigit() and int(number) >= 1, path, f"stage files are named {STAGE_FILE_PREFIX}<number>{STAGE_FILE_SUFFIX}")
+        layouts[int(number)] = compile_layout(path, read_json(path), screen_size)
+    require(1 in layouts, directory, f"no {STAGE_FILE_PREFIX}1{STAGE_FILE_SUFFIX}")
+    plans = []
+    layout = None
+    for stage, stats in enumerate(difficulty, start=1):
+        layout = layouts.get(stage, layout)
+        plans.append(StagePlan(stage, stats, *layout))
+    return StageTable(directory, plans, file_times)
+
+if __name__ == "__main__":
+    # Validates the stage files and prints the compiled table
+    try:
+        table = load_stage_table(sys.argv[1] if len(sys.argv) > 1 else os.path.join("assets", "stages"), (800, 600))
+    except StageDataError as e:
+        sys.exit(f"Invalid stage data: {e}")
+    print("stage  warehouse hp  AA gun hp  AA fire ms  jet hp  battleship hp  battleship at  spawns")
+    for plan in table.plans:
+        battleship_at = "-" if plan.battleship_at_ms is None else f"{plan.battleship_at_ms / 1000:.0f}s"
+        print(f"{plan.number:5d}  {plan.warehouse_health:12d}  {plan.aagun_health:9d}  {plan.aagun_fire_rate_ms:10d}"
+              f"  {plan.fighter_health:6d}  {plan.battleship_health:13d}  {battleship_at:>13}  {len(plan.spawns):6d}")
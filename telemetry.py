@@ -0,0 +1,209 @@
+import os
+import sys
+import time
+import queue
+import struct
+import threading
+import itertools
+from array import array
+from collections import Counter, defaultdict
+
+# Gameplay telemetry. The game records fixed-shape events into preallocated column arrays; full
+# batches are handed to a background thread which appends them to a per-session columnar file.
+# Recording an event is five array stores, so it costs next to nothing inside a frame.
+
+# Event kinds
+EVENT_SHOT = 1 # subject: weapon
+EVENT_HIT = 2 # subject: target, value: damage dealt
+EVENT_KILL = 3 # subject: target, value: points scored
+EVENT_DAMAGE_TAKEN = 4 # subject: damage source, value: damage
+EVENT_STAGE_START = 5
+EVENT_STAGE_CLEAR = 6 # value: ms from stage start to clear
+EVENT_BATTLESHIP_SPAWN = 7 # value: ms from stage start
+EVENT_BATTLESHIP_KILL = 8 # value: ms from stage start
+EVENT_GAME_OVER = 9 # value: final score
+EVENT_REWIND = 10 # value: game time rewound to; events recorded before this one at later times were replayed, see drop_rewound
+
+# Subjects
+WEAPON_VULCAN = 1
+WEAPON_MISSILE = 2
+TARGET_WAREHOUSE = 1
+TARGET_AAGUN = 2
+TARGET_FIGHTER_JET = 3
+TARGET_BATTLESHIP = 4
+SOURCE_AAGUN = 1
+SOURCE_FIGHTER_JET = 2
+SOURCE_TURRET = 3
+
+WEAPON_NAMES = {WEAPON_VULCAN: "vulcan", WEAPON_MISSILE: "missile"}
+TARGET_NAMES = {TARGET_WAREHOUSE: "warehouse", TARGET_AAGUN: "AA gun", TARGET_FIGHTER_JET: "fighter jet", TARGET_BATTLESHIP: "battleship"}
+SOURCE_NAMES = {0: "unknown", SOURCE_AAGUN: "AA gun", SOURCE_FIGHTER_JET: "fighter jet", SOURCE_TURRET: "battleship turret"}
+
+# File format: a sequence of blocks, each a header followed by one column after another in
+# native byte order
+BLOCK_HEADER = struct.Struct("<4sI") # magic, event count
+BLOCK_MAGIC = b"TLM1"
+COLUMN_TYPES = ("I", "B", "B", "H", "i") # time ms, kind, subject, stage, value
+FILE_SUFFIX = ".tlm"
+
+class TelemetryRecorder:
+    def __init__(self, directory, batch_size=8192, spare_batches=3):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"session-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}{FILE_SUFFIX}")
+        self.batch_size = batch_size
+        self.free_batches = queue.SimpleQueue() # Batches the writer has finished with, ready for reuse
+        for _ in range(spare_batches): self.free_batches.put(self.new_batch())
+        self.times, self.kinds, self.subjects, self.stages, self.values = self.new_batch()
+        self.count = 0
+        self.pending = queue.SimpleQueue()
+        self.writer = threading.Thread(target=self.write_batches, name="telemetry-writer", daemon=True)
+        self.writer.start()
+
+    def new_batch(self):
+        return tuple(array(typecode, [0]) * self.batch_size for typecode in COLUMN_TYPES)
+
+    def record(self, time_ms, kind, subject=0, stage=0, value=0):
+        i = self.count
+        self.times[i] = time_ms; self.kinds[i] = kind; self.subjects[i] = subject
+        self.stages[i] = stage; self.values[i] = value
+        self.count = i + 1
+        if self.count == self.batch_size: self.flush()
+
+    def flush(self):
+        # Hands the current batch to the writer thread; never waits for the disk
+        if self.count == 0: return
+        self.pending.put(((self.times, self.kinds, self.subjects, self.stages, self.values), self.count))
+        try:
+            batch = self.free_batches.get_nowait()
+        except queue.Empty: # Writer is behind; grow the pool rather than stall the frame
+            batch = self.new_batch()
+        self.times, self.kinds, self.subjects, self.stages, self.values = batch
+        self.count = 0
+
+    def close(self):
+        self.flush()
+        self.pending.put(None)
+        self.writer.join()
+
+    def write_batches(self):
+        with open(self.path, "ab") as f:
+            while True:
+                item = self.pending.get()
+                if item is None: return
+                batch, count = item
+                f.write(BLOCK_HEADER.pack(BLOCK_MAGIC, count))
+                for column in batch: f.write(memoryview(column)[:count])
+                f.flush()
+                self.free_batches.put(batch)
+
+# Queries
+def telemetry_files(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            yield from sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith(FILE_SUFFIX))
+        else:
+            yield path
+
+def read_blocks(paths):
+    # Yields (times, kinds, subjects, stages, values) column arrays, one tuple per stored batch
+    for path in telemetry_files(paths):
+        with open(path, "rb") as f:
+            while True:
+                header = f.read(BLOCK_HEADER.size)
+                if len(header) < BLOCK_HEADER.size: break
+                magic, count = BLOCK_HEADER.unpack(header)
+                if magic != BLOCK_MAGIC: raise ValueError(f"{path} is not a telemetry file or is corrupt")
+                columns = []
+                for typecode in COLUMN_TYPES:
+                    column = array(typecode)
+                    column.frombytes(f.read(count * column.itemsize))
+                    columns.append(column)
+                yield tuple(columns)
+
+def read_sessions(paths):
+    # Yields the blocks of each file as one list; a rewind marker can supersede events in any earlier block of its file
+    for path in telemetry_files(paths):
+        yield list(read_blocks([path]))
+
+def drop_rewound(blocks):
+    # An event is superseded when a later rewind marker went back to before it. Scanning backwards
+    # with the earliest rewind target seen so far, blocks without markers that end before that
+    # target are kept as they are; only blocks around a rewind are filtered event by event.
+    kept = []
+    rewound_to = float("inf")
+    for times, kinds, subjects, stages, values in reversed(blocks):
+        if EVENT_REWIND not in kinds.tobytes() and (not times or max(times) <= rewound_to):
+            kept.append((times, kinds, subjects, stages, values))
+            continue
+        keep = bytearray(len(kinds))
+        for i in range(len(kinds) - 1, -1, -1):
+            if kinds[i] == EVENT_REWIND:
+                rewound_to = min(rewound_to, values[i]); keep[i] = 1
+            else:
+                keep[i] = times[i] <= rewound_to
+        kept.append(tuple(array(column.typecode, itertools.compress(column, keep)) for column in (times, kinds, subjects, stages, values)))
+    kept.reverse()
+    return kept
+
+# Kinds whose values are summed; everything else is only counted
+SUMMED_KINDS = (EVENT_HIT, EVENT_KILL, EVENT_DAMAGE_TAKEN)
+RARE_KINDS = (EVENT_STAGE_CLEAR, EVENT_BATTLESHIP_SPAWN, EVENT_BATTLESHIP_KILL, EVENT_GAME_OVER)
+SUMMED_SELECTOR = bytes(1 if kind in SUMMED_KINDS else 0 for kind in range(256))
+RARE_SELECTOR = bytes(1 if kind in RARE_KINDS else 0 for kind in range(256))
+
+def summarize(paths):
+    # Filtering goes through bytes.translate and itertools.compress so that the per-event work
+    # stays in C; only the events that carry values reach the Python-level loops.
+    counts = Counter() # (kind, subject) -> events
+    sums = Counter() # (kind, subject) -> summed value
+    stage_clear_ms = defaultdict(list)
+    battleship_spawn_ms = []; battleship_kill_ms = []; final_scores = []
+    events = 0
+    blocks = (block for session in read_sessions(paths) for block in drop_rewound(session))
+    for times, kinds, subjects, stages, values in blocks:
+        events += len(kinds)
+        counts.update(zip(kinds, subjects))
+        kind_bytes = kinds.tobytes()
+        for kind, subject, value in itertools.compress(zip(kinds, subjects, values), kind_bytes.translate(SUMMED_SELECTOR)):
+            sums[kind, subject] += value
+        for kind, stage, value in itertools.compress(zip(kinds, stages, values), kind_bytes.translate(RARE_SELECTOR)):
+            if kind == EVENT_STAGE_CLEAR: stage_clear_ms[stage].append(value)
+            elif kind == EVENT_BATTLESHIP_SPAWN: battleship_spawn_ms.append(value)
+            elif kind == EVENT_BATTLESHIP_KILL: battleship_kill_ms.append(value)
+            else: final_scores.append(value)
+
+    total_shots = sum(counts[EVENT_SHOT, weapon] for weapon in WEAPON_NAMES)
+    return {
+        'events': events,
+        'shots_per_weapon': {name: counts[EVENT_SHOT, weapon] for weapon, name in WEAPON_NAMES.items()},
+        'hit_ratio_per_target': {name: counts[EVENT_HIT, target] / total_shots if total_shots else 0.0 for target, name in TARGET_NAMES.items()},
+        'damage_dealt_per_target': {name: sums[EVENT_HIT, target] for target, name in TARGET_NAMES.items()},
+        'damage_taken_per_source': {name: sums[EVENT_DAMAGE_TAKEN, source] for source, name in SOURCE_NAMES.items()},
+        'score_per_target': {name: sums[EVENT_KILL, target] for target, name in TARGET_NAMES.items()},
+        'kills_per_target': {name: counts[EVENT_KILL, target] for target, name in TARGET_NAMES.items()},
+        'avg_stage_clear_ms': {stage: sum(times) / len(times) for stage, times in sorted(stage_clear_ms.items())},
+        'battleship_spawn_ms': battleship_spawn_ms,
+        'battleship_kill_ms': battleship_kill_ms,
+        'games': len(final_scores),
+        'best_score': max(final_scores, default=0),
+        'rewinds': counts[EVENT_REWIND, 0],
+    }
+
+def print_summary(summary):
+    print(f"Events: {summary['events']}  Games: {summary['games']}  Best score: {summary['best_score']}  Rewinds: {summary['rewinds']}")
+    print("Shots fired: " + ", ".join(f"{name} {shots}" for name, shots in summary['shots_per_weapon'].items()))
+    print("Hit ratio: " + ", ".join(f"{name} {ratio:.1%}" for name, ratio in summary['hit_ratio_per_target'].items()))
+    print("Damage dealt: " + ", ".join(f"{name} {damage}" for name, damage in summary['damage_dealt_per_target'].items()))
+    print("Damage taken: " + ", ".join(f"{name} {damage}" for name, damage in summary['damage_taken_per_source'].items() if damage))
+    print("Score: " + ", ".join(f"{name} {points} ({summary['kills_per_target'][name]} kills)" for name, points in summary['score_per_target'].items()))
+    for stage, clear_ms in summary['avg_stage_clear_ms'].items():
+        print(f"Stage {stage}: cleared in {clear_ms / 1000:.1f}s on average")
+    spawns = summary['battleship_spawn_ms']; kills = summary['battleship_kill_ms']
+    if spawns:
+        print(f"Battleship: {len(spawns)} spawned (avg {sum(spawns) / len(spawns) / 1000:.1f}s into the stage), {len(kills)} sunk"
+              + (f" (avg {sum(kills) / len(kills) / 1000:.1f}s into the stage)" if kills else ""))
+
+if __name__ == "__main__":
+    started = time.perf_counter()
+    print_summary(summarize(sys.argv[1:] or ["telemetry"]))
+    print(f"Query took {time.perf_counter() - started:.2f}s")
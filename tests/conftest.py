@@ -0,0 +1,10 @@
+import os
+import sys
+
+# main.py is a game script: it opens a window and loads assets relative to the repository root
+# when imported, so the tests run headless from there
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.chdir(ROOT)
+sys.path.insert(0, ROOT)
@@ -0,0 +1,175 @@
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import subprocess
+from collections import Counter
+
+import pytest
+
+import main
+from netcode import LoopbackNetwork, UdpTransport, JOIN_PACKET, WELCOME_PACKET, PACKET_JOIN, PACKET_WELCOME, SERVER_FULL
+
+TICKS = 240
+UDP_TEST_SECONDS = 30 # Upper bound on the subprocess test; it normally finishes in a few seconds
+
+@pytest.fixture
+def network():
+    network = LoopbackNetwork()
+    main.reset_stage(is_first_load=True)
+    yield network
+    main.reset_stage(is_first_load=True)
+
+def start_game(network, player_count):
+    # The host plays slot 0; every other player is a headless client over the loopback network
+    server = main.CoopServer(network.endpoint("server"))
+    clients = [main.CoopClient(network.endpoint(f"client{slot}"), "server", mirror=False) for slot in range(1, player_count)]
+    server.step() # Receives the joins and sends the welcomes
+    for client in clients: client.step() # Takes the welcome and sends a first, idle input
+    main.reset_stage(is_first_load=True)
+    main.game_state = "playing"
+    for each_player in main.players: each_player.max_health = each_player.health = 100000 # Nobody dies mid-test
+    server.step() # Acknowledges the idle input in a "playing" snapshot, so clients start in sync with nothing pending
+    return server, clients
+
+def client_bits(slot, tick):
+    heading = main.INPUT_RIGHT if (tick // 30 + slot) % 2 == 0 else main.INPUT_LEFT
+    return heading | main.INPUT_VULCAN | (main.INPUT_UP if tick % 20 < 10 else main.INPUT_DOWN)
+
+@pytest.mark.parametrize("player_count", [2, 3, 4])
+def test_clients_mirror_the_server_entity_table(network, player_count):
+    server, clients = start_game(network, player_count)
+    try:
+        assert [client.slot for client in clients] == list(range(1, player_count))
+        for tick in range(TICKS):
+            main.player.input_bits = main.INPUT_MISSILE | main.INPUT_RIGHT
+            for client in clients: client.step(bits=client_bits(client.slot, tick))
+            server.step()
+        for client in clients:
+            client.poll()
+            assert client.tick == server.tick
+            assert client.entities == server.history[server.tick]
+        assert len(server.history[server.tick]) > player_count # Enemies and projectiles are replicated too
+    finally:
+        server.close()
+
+def test_prediction_replays_only_unacknowledged_inputs(network):
+    server, (client,) = start_game(network, 2)
+    try:
+        remote = server.clients["client1"]['player']
+        for tick in range(TICKS):
+            bits = client_bits(client.slot, tick)
+            client.step(bits=bits)
+            # The newest input is the only one the server has not applied yet
+            assert [entry[1] for entry in client.pending_inputs] == [bits]
+            server.step()
+            assert client.predicted_rect.topleft == remote.rect.topleft # Prediction matched the authoritative move
+        client.poll()
+        assert not client.pending_inputs # Everything was acknowledged by the last snapshot
+    finally:
+        server.close()
+
+def test_server_rejects_a_fifth_player(network):
+    server, clients = start_game(network, main.MAX_PLAYERS)
+    try:
+        latecomer = network.endpoint("latecomer")
+        latecomer.send(JOIN_PACKET.pack(PACKET_JOIN), "server")
+        server.step()
+        welcomes = [WELCOME_PACKET.unpack(data) for data, _ in latecomer.receive() if data[0] == PACKET_WELCOME]
+        assert welcomes == [(PACKET_WELCOME, SERVER_FULL)]
+        assert len(main.players) == main.MAX_PLAYERS
+        assert "latecomer" not in server.clients
+    finally:
+        server.close()
+    assert main.players == [main.player]
+
+def test_health_beyond_a_short_replicates(network):
+    # Health comes from difficulty.json, which has no upper bound
+    server, (client,) = start_game(network, 2)
+    try:
+        for wh in main.warehouses: wh.max_health = wh.health = 40000
+        server.step()
+        client.poll()
+        records = [main.ENTITY_RECORD.unpack(record) for record in client.entities.values()]
+        assert {record[3:5] for record in records if record[0] == main.ENTITY_WAREHOUSE} == {(40000, 40000)}
+    finally:
+        server.close()
+
+@pytest.fixture
+def hosted_game(tmp_path):
+    # Runs `main.py --host` in its own process on 127.0.0.1, on stage data where the battleship arrives
+    # as play starts and dies to a single hit, next to one warehouse (so the stage never clears) and a jet
+    stage_dir = tmp_path / "stages"; stage_dir.mkdir()
+    with open(os.path.join("assets", "stages", "difficulty.json"), encoding="utf-8") as f: difficulty = json.load(f)
+    difficulty["curves"]["battleship"]["health"] = {"base": 1, "per_stage": 0}
+    (stage_dir / "difficulty.json").write_text(json.dumps(difficulty), encoding="utf-8")
+    (stage_dir / "stage-1.json").write_text(json.dumps({"battleship_at_ms": 0, "waves": [{"at_ms": 0, "spawns": [
+        {"kind": "warehouse", "x": 700, "y": 540}, {"kind": "fighter_jet", "x": 700, "y": 50}]}]}), encoding="utf-8")
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe:
+        probe.bind(("127.0.0.1", 0)); port = probe.getsockname()[1]
+    host = subprocess.Popen([sys.executable, "main.py", "--host", str(port), "--stages", str(stage_dir), "--scores-db", str(tmp_path / "scores.db")],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    yield host, ("127.0.0.1", port)
+    host.kill()
+    host.communicate()
+
+def check_mirror(client):
+    # Every replicated entity has exactly one mirrored sprite, in the groups the kind belongs to
+    kinds = Counter(record[0] for record in client.entities.values())
+    assert client.sprites.keys() == client.entities.keys()
+    assert len(main.players) == kinds[main.ENTITY_PLAYER]
+    assert sum(len(each_player.vulcan_bullets) for each_player in main.players) == kinds[main.ENTITY_VULCAN]
+    assert sum(len(each_player.missiles) for each_player in main.players) == kinds[main.ENTITY_MISSILE]
+    assert len(main.enemy_bullets) == kinds[main.ENTITY_ENEMY_BULLET]
+    assert len(main.warehouses) == kinds[main.ENTITY_WAREHOUSE]
+    assert len(main.aa_guns) == kinds[main.ENTITY_AAGUN]
+    assert len(main.fighter_jets) == kinds[main.ENTITY_FIGHTER_JET]
+    assert main.battleship.is_active == (kinds[main.ENTITY_BATTLESHIP] == 1)
+    for entity_id, record in client.entities.items():
+        kind, x, y, _, _, aux = main.ENTITY_RECORD.unpack(record)
+        sprite = client.sprites[entity_id]
+        if kind == main.ENTITY_VULCAN: assert sprite in client.players_by_slot[aux].vulcan_bullets # Owned by the firing slot
+        if kind == main.ENTITY_MISSILE: assert sprite in client.players_by_slot[aux].missiles
+        if kind == main.ENTITY_FIGHTER_JET: assert sprite.image_angle_deg == aux
+        if entity_id != client.own_id: assert sprite.rect.topleft == (x, y)
+    return kinds
+
+def test_mirrored_client_over_udp_tracks_a_hosted_game(hosted_game):
+    host, address = hosted_game
+    client = main.CoopClient(UdpTransport(("127.0.0.1", 0)), address)
+    gunner = main.CoopClient(UdpTransport(("127.0.0.1", 0)), address, mirror=False) # A third player whose bullets the client mirrors
+    seen = {} # entity id -> (kind, mirrored sprite) for everything ever replicated
+    removed = Counter()
+    battleship_seen = False
+    gunner_bullet_seen = False
+    try:
+        deadline = time.monotonic() + UDP_TEST_SECONDS
+        while not (battleship_seen and gunner_bullet_seen and removed[main.ENTITY_BATTLESHIP] and removed[main.ENTITY_VULCAN]):
+            assert host.poll() is None, host.stderr.read().decode()
+            assert time.monotonic() < deadline, f"timed out: battleship seen {battleship_seen}, gunner bullets seen {gunner_bullet_seen}, removed {dict(removed)}"
+            # Fly to the left edge at the battleship's height and keep firing, so it flies into the bullets
+            bits = main.INPUT_VULCAN | main.INPUT_LEFT
+            if client.predicted_rect is not None and client.predicted_rect.centery > main.SCREEN_HEIGHT // 4 + 50: bits |= main.INPUT_UP
+            client.step(bits=bits)
+            gunner.step(bits=main.INPUT_VULCAN | main.INPUT_RIGHT)
+            if client.tick == 0: # No snapshot yet; only the local helicopter exists
+                time.sleep(main.FIXED_TIMESTEP_MS / 1000); continue
+            kinds = check_mirror(client)
+            battleship_seen |= kinds[main.ENTITY_BATTLESHIP] == 1
+            gunner_bullet_seen |= any(sprite in client.players_by_slot[gunner.slot].vulcan_bullets for sprite in client.sprites.values())
+            for entity_id in client.entities.keys() - seen.keys():
+                seen[entity_id] = (main.ENTITY_RECORD.unpack(client.entities[entity_id])[0], client.sprites[entity_id])
+            for entity_id in [entity_id for entity_id in seen if entity_id not in client.entities]:
+                kind, sprite = seen.pop(entity_id)
+                assert not sprite.alive() # Removed entities leave every group
+                removed[kind] += 1
+            time.sleep(main.FIXED_TIMESTEP_MS / 1000)
+        assert {client.slot, gunner.slot} == {1, 2} and client.game_state == "playing"
+        assert not main.battleship.is_active
+    finally:
+        for sprite in list(client.sprites.values()): client.remove_mirror_sprite(sprite)
+        client.transport.close(); gunner.transport.close()
+        main.reset_stage(is_first_load=True)
+    assert main.players == [main.player]
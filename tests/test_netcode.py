@@ -0,0 +1,59 @@
+import struct
+
+from netcode import (LoopbackNetwork, diff_entities, apply_entity_delta, pack_snapshot, unpack_snapshot,
+                     PACKET_SNAPSHOT)
+
+RECORD = struct.Struct("<Bhh")
+HEADER = struct.Struct("<iH")
+
+def record(kind, x, y):
+    return RECORD.pack(kind, x, y)
+
+def test_diff_and_apply_round_trip_with_changes_additions_and_removals():
+    baseline = {1: record(0, 10, 10), 2: record(1, 20, 20), 3: record(2, 30, 30)}
+    entities = {1: record(0, 10, 10), 2: record(1, 25, 20), 4: record(3, 40, 40)}
+    changed, removed = diff_entities(entities, baseline)
+    assert sorted(changed) == [(2, record(1, 25, 20)), (4, record(3, 40, 40))]
+    assert removed == [3]
+    assert apply_entity_delta(baseline, changed, removed) == entities
+    assert baseline[3] == record(2, 30, 30) # The baseline itself is left alone
+
+def test_delta_against_a_stale_baseline_still_reaches_the_current_table():
+    # The server diffs against the newest snapshot the client acknowledged, which can be several ticks old
+    tick1 = {1: record(0, 0, 0), 2: record(1, 5, 5)}
+    tick2 = {1: record(0, 1, 0), 2: record(1, 6, 5), 3: record(2, 7, 7)}
+    tick3 = {1: record(0, 2, 0), 3: record(2, 8, 7)}
+    assert apply_entity_delta(tick1, *diff_entities(tick3, tick1)) == tick3
+    assert apply_entity_delta(tick2, *diff_entities(tick3, tick2)) == tick3
+    assert apply_entity_delta({}, *diff_entities(tick3, {})) == tick3 # No usable baseline: full table
+
+def test_removing_an_entity_the_baseline_never_had_is_harmless():
+    baseline = {1: record(0, 0, 0)}
+    assert apply_entity_delta(baseline, [], [7]) == baseline
+
+def test_pack_snapshot_round_trip():
+    baseline = {1: record(0, 1, 2), 2: record(1, 3, 4), 3: record(2, 5, 6)}
+    entities = {1: record(0, 1, 3), 3: record(2, 5, 6), 9: record(4, 7, 8)}
+    changed, removed = diff_entities(entities, baseline)
+    game_header = HEADER.pack(1500, 3)
+    data = pack_snapshot(42, 40, 17, game_header, changed, removed)
+    assert data[0] == PACKET_SNAPSHOT
+    tick, baseline_tick, input_ack, unpacked_header, unpacked_changed, unpacked_removed = unpack_snapshot(data, HEADER.size, RECORD.size)
+    assert (tick, baseline_tick, input_ack, unpacked_header) == (42, 40, 17, game_header)
+    assert unpacked_changed == changed and unpacked_removed == removed
+    assert apply_entity_delta(baseline, unpacked_changed, unpacked_removed) == entities
+
+def test_pack_snapshot_round_trip_without_changes():
+    data = pack_snapshot(5, 4, 0, HEADER.pack(0, 1), [], [])
+    assert unpack_snapshot(data, HEADER.size, RECORD.size) == (5, 4, 0, HEADER.pack(0, 1), [], [])
+
+def test_loopback_delivers_in_order_and_drops_datagrams_to_unknown_addresses():
+    network = LoopbackNetwork()
+    server = network.endpoint("server"); client = network.endpoint("client")
+    client.send(b"\x01a", "server"); client.send(b"\x01b", "server"); client.send(b"\x01c", "nowhere")
+    assert server.receive() == [(b"\x01a", "client"), (b"\x01b", "client")]
+    assert server.receive() == []
+    assert client.bytes_sent == 6
+    client.close()
+    server.send(b"\x02", "client") # Closed endpoints behave like a lost datagram
+    assert client.receive() == []
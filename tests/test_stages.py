@@ -0,0 +1,65 @@
+import os
+import json
+import shutil
+
+import pytest
+
+import main
+from stages import load_stage_table, StageDataError, DIFFICULTY_FILE
+
+SHIPPED = os.path.join("assets", "stages")
+SCREEN = (main.SCREEN_WIDTH, main.SCREEN_HEIGHT)
+OPENING = [{"kind": "warehouse", "x": 150, "y": 530}, {"kind": "aa_gun", "x": 400, "y": 570}]
+REINFORCEMENTS = [{"kind": "fighter_jet", "x": 100, "y": 50}, {"kind": "fighter_jet", "x": 700, "y": 50}]
+
+@pytest.fixture
+def stage_dir(tmp_path):
+    # A stages directory with a two-wave stage 1 (written out of order) and a single-wave stage 3
+    shutil.copy(os.path.join(SHIPPED, DIFFICULTY_FILE), tmp_path)
+    write_stage(tmp_path, 1, {"battleship_at_ms": None, "waves": [{"at_ms": 60000, "spawns": REINFORCEMENTS}, {"at_ms": 0, "spawns": OPENING}]})
+    write_stage(tmp_path, 3, {"waves": [{"at_ms": 0, "spawns": REINFORCEMENTS}]})
+    return tmp_path
+
+def write_stage(directory, number, layout):
+    with open(os.path.join(directory, f"stage-{number}.json"), "w", encoding="utf-8") as f: json.dump(layout, f)
+
+def test_shipped_stages_keep_the_original_layout():
+    table = load_stage_table(SHIPPED, SCREEN)
+    assert len(table.plans) == 99
+    assert all(plan.spawns == table.plan(1).spawns for plan in table.plans)
+    assert len(table.plan(1).spawns) == 9 # 5 warehouses, 3 AA guns and a fighter jet, all at the start
+    assert {spawn[0] for spawn in table.plan(1).spawns} == {0}
+
+def test_waves_compile_into_one_timeline(stage_dir):
+    table = load_stage_table(str(stage_dir), SCREEN)
+    assert [spawn[0] for spawn in table.plan(1).spawns] == [0, 0, 60000, 60000]
+    assert [spawn[1] for spawn in table.plan(1).spawns] == ["warehouse", "aa_gun", "fighter_jet", "fighter_jet"]
+    assert table.plan(2).spawns is table.plan(1).spawns # Stage 2 has no file and reuses stage 1's layout
+    assert table.plan(2).fighter_health > table.plan(1).fighter_health # ...with its own difficulty
+    assert [spawn[1] for spawn in table.plan(3).spawns] == ["fighter_jet", "fighter_jet"]
+    assert table.plan(1).battleship_at_ms is None and table.plan(3).battleship_at_ms is None
+
+def test_later_waves_spawn_on_time_or_when_the_screen_is_cleared(stage_dir):
+    table = load_stage_table(str(stage_dir), SCREEN)
+    try:
+        main.reset_stage(is_first_load=True)
+        for sprite in [*main.warehouses, *main.aa_guns, *main.fighter_jets]: sprite.kill()
+        main.stage_plan, main.stage_spawn_index = table.plan(1), 0
+        main.spawn_due_entities(0)
+        assert (len(main.warehouses), len(main.aa_guns), len(main.fighter_jets)) == (1, 1, 0)
+        main.spawn_due_entities(59999)
+        assert main.stage_spawn_index == 2
+        main.spawn_due_entities(60000)
+        assert len(main.fighter_jets) == 2 and main.stage_spawn_index == len(main.stage_plan.spawns)
+
+        main.stage_spawn_index = 2
+        for sprite in [*main.warehouses, *main.aa_guns, *main.fighter_jets]: sprite.kill()
+        main.spawn_due_entities(1000) # Nothing left on screen, so the second wave is brought forward
+        assert len(main.fighter_jets) == 2
+    finally:
+        main.reset_stage(is_first_load=True)
+
+def test_bad_stage_files_name_the_field(stage_dir):
+    write_stage(stage_dir, 3, {"waves": [{"at_ms": 0, "spawns": [{"kind": "submarine", "x": 0, "y": 0}]}]})
+    with pytest.raises(StageDataError, match=r"stage-3\.json: waves\[0\]\.spawns\[0\]\.kind"):
+        load_stage_table(str(stage_dir), SCREEN)